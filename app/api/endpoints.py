@@ -1,9 +1,18 @@
+import hashlib
+import os
+
+from app.core.cache import CacheLRU, etag_coincide
+from app.core.metrics import abrir_etapa, etapa, etiquetar
+from app.core.security import get_admin_user
 from app.database import get_db
 from app.models.grafo import GrafoRutas
 from app.models.pais_model import PaisModel
-from app.services.rutas_service import RutasService
-from fastapi import APIRouter, HTTPException, Depends
+from app.services.coordenadas import resolutor
+from app.services.grafo_store import get_grafo_usuario, recargar_grafo
+from app.services.rutas_service import RutasService, PaisInvalido, ProductoInvalido, RutaNoEncontrada
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from sqlalchemy.orm import Session
 
@@ -12,14 +21,15 @@ router = APIRouter(tags=["Rutas"])
 
 
 class RutaRequest(BaseModel):
-    algoritmo: str      # "dijkstra" o "floyd-warshall"
-    criterio: str       # "rapidez" o "economia"
+    algoritmo: str      # "dijkstra", "floyd-warshall", "astar", "bidireccional" o "ch"
+    criterio: str       # "rapidez", "economia" o "pareto" (frente tiempo/costo)
     origen: str
     destino: str
     producto_id: Optional[str] = None
+    k: Optional[int] = None   # > 1: devuelve también las k mejores rutas alternativas
 
 
-class RutaResponse(BaseModel):
+class RutaResumen(BaseModel):
     ruta: List[str]
     tipo_ruta: str
     distancia_total: float
@@ -27,27 +37,181 @@ class RutaResponse(BaseModel):
     costo_total: float
 
 
-@router.post("/ruta-optima", response_model=RutaResponse)
-async def ruta_optima(req: RutaRequest, db: Session = Depends(get_db)):
-    if req.origen == req.destino:
-        raise HTTPException(status_code=400, detail="Origen y destino no pueden ser iguales.")
+class RutaResponse(RutaResumen):
+    alternativas: Optional[List[RutaResumen]] = None
 
-    grafo = GrafoRutas()
-    grafo.cargar_desde_bd(db)   # ← AHORA CARGA TODO DE AIVEN
 
-    service = RutasService(grafo)
+MAX_ITEMS_LOTE = 1000
+
+
+class RutaLoteItem(BaseModel):
+    origen: str
+    destino: str
+    criterio: str       # "rapidez" o "economia"
+    producto_id: Optional[str] = None
+
+
+class RutaLoteRequest(BaseModel):
+    items: List[RutaLoteItem]
+
+
+class RutaLoteResultado(BaseModel):
+    origen: str
+    destino: str
+    criterio: str
+    producto_id: Optional[str] = None
+    ruta: Optional[List[str]] = None
+    tipo_ruta: Optional[str] = None
+    distancia_total: Optional[float] = None
+    tiempo_total: Optional[float] = None
+    costo_total: Optional[float] = None
+    error: Optional[str] = None
+
 
-    resultado = service.calcular_ruta_optima(
-        algoritmo=req.algoritmo,
-        criterio=req.criterio,
-        origen=req.origen,
-        destino=req.destino,
-        producto_id=req.producto_id
+class RutaLoteResponse(BaseModel):
+    resultados: List[RutaLoteResultado]
+
+
+MAX_K = 20
+
+# Valores válidos como etiqueta de métricas (cualquier otro se agrupa en "otro")
+ALGORITMOS = {"dijkstra", "floyd-warshall", "astar", "bidireccional", "ch"}
+CRITERIOS = {"rapidez", "economia", "pareto"}
+
+# Resultados de /ruta-optima por (petición normalizada, versión del grafo)
+_cache_resultados = CacheLRU(
+    int(os.getenv("ECOROUTE_CACHE_RUTAS", "2048")),
+    ttl=float(os.getenv("ECOROUTE_CACHE_RUTAS_TTL", "300")),
+)
+
+
+def _clave_ruta(req: RutaRequest, version: str) -> tuple:
+    """
+    Peticiones que dan la misma respuesta comparten clave. Con pareto o
+    k > 1 el algoritmo no influye en el resultado.
+    """
+    criterio = req.criterio.strip().lower()
+    k = req.k if req.k and req.k > 1 else 1
+    algoritmo = "" if criterio == "pareto" or k > 1 else req.algoritmo.strip().lower()
+    return (version, algoritmo, criterio, req.origen.strip(), req.destino.strip(), req.producto_id or None, k)
+
+
+def _etag(clave: tuple) -> str:
+    return '"' + hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+@router.post("/ruta-optima", response_model=RutaResponse, response_model_exclude_none=True)
+async def ruta_optima(
+    req: RutaRequest,
+    request: Request,
+    response: Response,
+    grafo: GrafoRutas = Depends(get_grafo_usuario),
+):
+    if req.origen == req.destino:
+        raise HTTPException(status_code=400, detail="Origen y destino no pueden ser iguales.")
+    if req.k is not None and not 1 <= req.k <= MAX_K:
+        raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {MAX_K}.")
+
+    # El resultado solo depende de la petición y de la versión del grafo
+    # (la de un overlay incluye las personalizaciones del usuario)
+    clave = _clave_ruta(req, grafo.version)
+    algoritmo = clave[1] or "-"   # pareto / k > 1: no depende del algoritmo
+    etiquetar(
+        algoritmo=algoritmo if algoritmo in ALGORITMOS or algoritmo == "-" else "otro",
+        criterio=clave[2] if clave[2] in CRITERIOS else "otro",
     )
+    etag = _etag(clave)
+
+    with etapa("cache"):
+        resultado = _cache_resultados.get(clave)
+    if resultado is not None:
+        # Solo un resultado ya calculado (petición válida) puede responder 304
+        if etag_coincide(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        abrir_etapa("serializacion")
+        return resultado
+
+    # Snapshot compartido (cargado al arrancar) más las rutas propias del usuario, si las tiene
+    service = RutasService(grafo)
 
+    # El cálculo es CPU puro: fuera del event loop para no frenar otras peticiones
+    # Se calcula con los mismos valores normalizados de la clave
+    try:
+        resultado = await run_in_threadpool(
+            service.calcular_ruta_optima,
+            algoritmo=req.algoritmo.strip().lower(),
+            criterio=clave[2],
+            origen=clave[3],
+            destino=clave[4],
+            producto_id=clave[5],
+            k=req.k,
+        )
+    except (PaisInvalido, ProductoInvalido, RutaNoEncontrada) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    _cache_resultados.put(clave, resultado)
+    response.headers["ETag"] = etag
+    abrir_etapa("serializacion")
     return resultado
 
 
+@router.post("/rutas-optimas/batch", response_model=RutaLoteResponse)
+def rutas_optimas_batch(req: RutaLoteRequest, grafo: GrafoRutas = Depends(get_grafo_usuario)):
+    """
+    Calcula muchas rutas en una sola llamada. Se corre un único árbol de
+    caminos mínimos por cada (origen, criterio, producto), no una búsqueda
+    por par. Los errores vienen por ítem en el campo `error`.
+    """
+    if len(req.items) > MAX_ITEMS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_ITEMS_LOTE} rutas por lote.")
+
+    service = RutasService(grafo)
+    items = [item.dict() for item in req.items]
+    resultados = service.calcular_rutas_lote(items)
+
+    return {
+        "resultados": [
+            {**item, **resultado} for item, resultado in zip(items, resultados)
+        ]
+    }
+
+
+@router.get("/ruta-optima/arbol")
+def arbol_rutas(
+    origen: str = Query(..., description="ID de país origen, ej. PER"),
+    criterio: str = Query("rapidez", description="rapidez o economia"),
+    producto_id: Optional[str] = Query(None),
+    grafo: GrafoRutas = Depends(get_grafo_usuario),
+):
+    """
+    Costo, tiempo y distancia desde `origen` a cada país alcanzable, con el
+    predecesor de cada uno (vista de alcance / isócronas en el mapa).
+    """
+    service = RutasService(grafo)
+    try:
+        return service.calcular_arbol(origen, criterio, producto_id)
+    except (PaisInvalido, ProductoInvalido) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/grafo/recargar")
+def recargar_grafo_endpoint(db: Session = Depends(get_db), user=Depends(get_admin_user)):
+    """
+    Vuelve a leer paises/rutas desde la BD y reemplaza el grafo compartido.
+    Solo administradores: usuarios registrados listados en ECOROUTE_ADMIN_USERS
+    (si no está definido, responde 403 a todos).
+    """
+    snap = recargar_grafo(db)
+    # Los países pueden haber cambiado: se rehace el índice de coordenadas
+    resolutor.reconstruir(db)
+    return {"version": snap.version, "nodos": len(snap.grafo.nodos)}
+
+
 @router.get("/api/nodes")
 def get_nodes(db: Session = Depends(get_db)):
     paises = db.query(PaisModel).all()
@@ -1,82 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
-from sqlalchemy import distinct
-import unicodedata
+from typing import List, Optional
+import json
+import os
 
-from app.database import get_db
+from app.core.cache import etag_coincide
+from app.database import SessionLocal, get_db
 from app.models.trade_data import TradeData
+from app.services.agregados_comercio import AGRUPACIONES, resumir, vista_agregados
+from app.services.coordenadas import COUNTRY_COORDS, SIN_COORDENADAS, normalize_country, resolutor  # noqa: F401
+from app.services.opciones_comercio import vista_opciones
 
 router = APIRouter(tags=["TradeFlows"])
 
-# --- TU DICCIONARIO DE COORDENADAS (Mantenlo igual) ---
-COUNTRY_COORDS = {
-    "alemania": (51.1657, 10.4515),
-    "germany": (51.1657, 10.4515),
-    "china": (35.8617, 104.1954),
-    "brasil": (-14.2350, -51.9253),
-    "brazil": (-14.2350, -51.9253),
-    "japon": (36.2048, 138.2529),
-    "japan": (36.2048, 138.2529),
-    "espana": (40.4637, -3.7492),
-    "spain": (40.4637, -3.7492),
-    "francia": (46.6034, 1.8883),
-    "france": (46.6034, 1.8883),
-    "corea del sur": (35.9078, 127.7669),
-    "south korea": (35.9078, 127.7669),
-    "mexico": (23.6345, -102.5528),
-    "eeuu": (37.0902, -95.7129),
-    "estados unidos": (37.0902, -95.7129),
-    "usa": (37.0902, -95.7129),
-    "united states": (37.0902, -95.7129),
-    "india": (20.5937, 78.9629),
-    "sudafrica": (-30.5595, 22.9375),
-    "south africa": (-30.5595, 22.9375),
-    "peru": (-9.19, -75.0152),
-    "chile": (-35.6751, -71.5430),
-    "egipto": (26.8206, 30.8025),
-    "egypt": (26.8206, 30.8025),
-    "colombia": (4.5709, -74.2973),
-    "vietnam": (14.0583, 108.2772),
-    "argentina": (-38.4161, -63.6167),
-    "republica argentina": (-38.4161, -63.6167),
-    "rep argentina": (-38.4161, -63.6167),
-}
-
-def normalize_country(name: str) -> str:
-    if not name: return ""
-    s = str(name).strip().replace(".", "")
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    return s.lower()
+# Flujos por petición en /api/trade-flow-details
+MAX_FLUJOS_LOTE = 500
+
+# Página de /api/trade-flows en json cuando no se indica limit
+PAGINA_DEFECTO = 500
+
+# Filas por lote del cursor en la exportación NDJSON
+EXPORT_LOTE = int(os.getenv("ECOROUTE_EXPORT_LOTE", "1000"))
 
 def get_coords(country_name):
-    key = normalize_country(country_name)
-    return COUNTRY_COORDS.get(key, (None, None))
+    # Resolución memorizada contra `paises` + alias (ver services/coordenadas)
+    coords = resolutor.resolver(country_name)
+    return coords.lat, coords.lon
 
 
 # --- ENDPOINT 1: OPTIMIZADO PARA SELECTORES ---
 # Solo devuelve listas de valores únicos, no toda la data.
 @router.get("/api/trade-options")
-def get_trade_options(db: Session = Depends(get_db)):
+def get_trade_options(request: Request):
     """
     Devuelve listas únicas de orígenes, destinos y productos para llenar los dropdowns del frontend.
-    Mucho más rápido que traer 5000 filas.
+    Sale de una vista en memoria ya serializada (ver services/opciones_comercio):
+    no consulta la BD por petición y responde 304 si el cliente ya la tiene.
     """
     try:
-        # Consultas optimizadas con DISTINCT
-        origins = db.query(distinct(TradeData.origin)).filter(TradeData.origin.isnot(None)).all()
-        destinations = db.query(distinct(TradeData.destination)).filter(TradeData.destination.isnot(None)).all()
-        products = db.query(distinct(TradeData.product)).filter(TradeData.product.isnot(None)).all()
-        
-        return {
-            "origins": sorted([r[0] for r in origins if r[0]]),
-            "destinations": sorted([r[0] for r in destinations if r[0]]),
-            "products": sorted([r[0] for r in products if r[0]])
-        }
+        opciones = vista_opciones.obtener()
     except Exception as e:
         print(f"Error fetching options: {e}")
         return {"origins": [], "destinations": [], "products": []}
 
+    cabeceras = {"ETag": opciones.etag, "Cache-Control": "no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), opciones.etag):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=opciones.cuerpo, media_type="application/json", headers=cabeceras)
+
 
 # --- ENDPOINT 2: DETALLE DE FLUJO ESPECÍFICO ---
 # Busca solo lo que el usuario seleccionó.
@@ -102,9 +76,17 @@ def get_trade_flow_detail(
         # Si no existe exacto, intentamos buscar algo similar (opcional)
         raise HTTPException(status_code=404, detail="No se encontraron datos comerciales para esta ruta y producto.")
 
-    # Calculamos coordenadas
-    orig_lat, orig_lng = get_coords(flow.origin)
-    dest_lat, dest_lng = get_coords(flow.destination)
+    return _detalle_flujo(flow, _coordenadas_de([flow]))
+
+
+def _coordenadas_de(filas) -> dict:
+    # Una resolución por nombre distinto del lote, no dos por fila
+    return resolutor.resolver_lote(n for f in filas for n in (f.origin, f.destination))
+
+
+def _detalle_flujo(flow: TradeData, coords: dict) -> dict:
+    origen = coords.get(flow.origin, SIN_COORDENADAS)
+    destino = coords.get(flow.destination, SIN_COORDENADAS)
 
     return {
         "origin": flow.origin,
@@ -116,38 +98,199 @@ def get_trade_flow_detail(
         "total_price": float(flow.total_price or 0),
         "date": str(flow.date) if flow.date else None,
         # Coordenadas para el mapa
-        "origin_lat": orig_lat,
-        "origin_lng": orig_lng,
-        "destination_lat": dest_lat,
-        "destination_lng": dest_lng,
+        "origin_lat": origen.lat,
+        "origin_lng": origen.lon,
+        "destination_lat": destino.lat,
+        "destination_lng": destino.lon,
+        # País de `paises` (null si solo se reconoció por alias)
+        "origin_country_id": origen.pais_id,
+        "destination_country_id": destino.pais_id,
+    }
+
+
+class FlujoClave(BaseModel):
+    origin: str
+    destination: str
+    product: str
+
+
+class FlujosRequest(BaseModel):
+    flows: List[FlujoClave]
+
+
+# --- ENDPOINT 2b: DETALLE DE VARIOS FLUJOS EN UNA CONSULTA ---
+# El mapa pide todos los flujos seleccionados de una vez en lugar de uno por uno.
+@router.post("/api/trade-flow-details")
+def get_trade_flow_details(req: FlujosRequest, db: Session = Depends(get_db)):
+    """
+    Detalle de muchos (origen, destino, producto) con una sola consulta
+    `(origin, destination, product) IN (...)`, resuelta con el índice compuesto.
+    Devuelve los encontrados en el orden pedido y aparte los que no existen.
+    """
+    if not req.flows:
+        return {"flows": [], "missing": []}
+    if len(req.flows) > MAX_FLUJOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_FLUJOS_LOTE} flujos por consulta.")
+
+    claves = list(dict.fromkeys((f.origin, f.destination, f.product) for f in req.flows))
+
+    filas = db.execute(
+        select(TradeData)
+        .where(tuple_(TradeData.origin, TradeData.destination, TradeData.product).in_(claves))
+        .order_by(TradeData.id)
+    ).scalars()
+
+    # Como .first() en el detalle individual: una fila por combinación
+    por_clave = {}
+    for flow in filas:
+        por_clave.setdefault((flow.origin, flow.destination, flow.product), flow)
+
+    coords = _coordenadas_de(por_clave.values())
+    return {
+        "flows": [_detalle_flujo(por_clave[c], coords) for c in claves if c in por_clave],
+        "missing": [
+            {"origin": o, "destination": d, "product": p}
+            for o, d, p in claves if (o, d, p) not in por_clave
+        ],
+    }
+
+# --- ENDPOINT 2c: AGREGADOS PARA LOS MAPAS DE CALOR ---
+# Reemplaza bajar filas y agrupar en el navegador; cubre toda la tabla.
+@router.get("/api/trade-flows/aggregate")
+def get_trade_flows_aggregate(
+    group_by: str = Query("route", description="'route' (origen-destino), 'product' o 'month'"),
+    origin: Optional[str] = Query(None),
+    destination: Optional[str] = Query(None),
+    product: Optional[str] = Query(None),
+    month: Optional[str] = Query(None, description="YYYY-MM"),
+    limit: Optional[int] = Query(None, ge=1, description="Solo los N grupos con más total_price"),
+):
+    """
+    Count, suma y promedio de total_price, quantity y tariff por grupo.
+    Sale de un cubo en memoria que se mantiene al día con trade_data
+    (ver services/agregados_comercio), no de una consulta por petición.
+    """
+    if group_by not in AGRUPACIONES:
+        raise HTTPException(status_code=400, detail=f"group_by no válido (use {', '.join(AGRUPACIONES)}).")
+
+    filtros = {
+        dimension: valor
+        for dimension, valor in (("origin", origin), ("destination", destination), ("product", product), ("month", month))
+        if valor is not None
     }
+    cubo = vista_agregados.obtener()
+    grupos = resumir(cubo, group_by, filtros)
+    return {
+        "group_by": group_by,
+        "rows": sum(g["count"] for g in grupos) if filtros else cubo.filas,
+        "groups": grupos[:limit] if limit else grupos,
+    }
+
 
 # --- ENDPOINT 3: BACKWARDS COMPATIBILITY (Opcional) ---
-# Mantenemos este si necesitas traer "todo" para Kruskal/TSP global, pero limitamos a 500
+# Mantenemos este si necesitas traer "todo" para Kruskal/TSP global.
+# Se pagina por id (after_id) y con format=ndjson se exporta la tabla entera en streaming.
+_COLUMNAS_FLUJO = (
+    TradeData.id,
+    TradeData.origin,
+    TradeData.destination,
+    TradeData.product,
+    TradeData.total_price,
+    TradeData.tariff,
+)
+
+
+def _consulta_flujos(after_id: Optional[int], limit: Optional[int]):
+    # Solo las columnas que se devuelven, en orden de id para paginar por clave
+    consulta = select(*_COLUMNAS_FLUJO).order_by(TradeData.id)
+    if after_id is not None:
+        consulta = consulta.where(TradeData.id > after_id)
+    if limit is not None:
+        consulta = consulta.limit(limit)
+    return consulta
+
+
+def _flujo_resumen(row, solo_con_coords: bool, coords: dict) -> Optional[dict]:
+    origen = coords.get(row.origin, SIN_COORDENADAS)
+    destino = coords.get(row.destination, SIN_COORDENADAS)
+
+    # Para el mapa solo sirven los flujos con coordenadas en ambos extremos
+    if solo_con_coords and (origen.lat is None or destino.lat is None):
+        return None
+    return {
+        "id": row.id,
+        "origin": row.origin,
+        "destination": row.destination,
+        "product": row.product,
+        "total_price": float(row.total_price or 0),
+        "origin_lat": origen.lat,
+        "origin_lng": origen.lon,
+        "destination_lat": destino.lat,
+        "destination_lng": destino.lon,
+        "tariff": float(row.tariff or 0)
+    }
+
+
+def _exportar_ndjson(after_id: Optional[int], limit: Optional[int], solo_con_coords: bool):
+    """
+    Una línea JSON por flujo. Usa su propia sesión (la de Depends se cierra
+    antes de que termine el streaming) y un cursor del lado del servidor
+    leído de a EXPORT_LOTE filas: la memoria no crece con la tabla.
+    """
+    with SessionLocal() as db:
+        filas = db.execute(
+            _consulta_flujos(after_id, limit).execution_options(stream_results=True, yield_per=EXPORT_LOTE)
+        )
+        for lote in filas.partitions():
+            coords = _coordenadas_de(lote)
+            lineas = []
+            for row in lote:
+                flujo = _flujo_resumen(row, solo_con_coords, coords)
+                if flujo is not None:
+                    lineas.append(json.dumps(flujo, ensure_ascii=False))
+            if lineas:
+                yield ("\n".join(lineas) + "\n").encode("utf-8")
+
+
 @router.get("/api/trade-flows")
-def get_all_trade_flows(limit: int = 500, db: Session = Depends(get_db)):
+def get_all_trade_flows(
+    limit: Optional[int] = Query(
+        None, ge=1, description=f"Filas a leer (en json, {PAGINA_DEFECTO} si se omite; en ndjson, todas)"
+    ),
+    after_id: Optional[int] = Query(None, description="Devuelve flujos con id mayor (paginación)"),
+    format: str = Query("json", description="'json' (paginado) o 'ndjson' (streaming)"),
+    solo_con_coords: Optional[bool] = Query(
+        None, description="Descartar flujos sin coordenadas (por defecto sí en json, no en ndjson)"
+    ),
+    db: Session = Depends(get_db),
+):
     """
-    Trae una muestra de flujos (máximo 500) para visualización general o algoritmos de red.
+    Trae flujos para visualización general o algoritmos de red, en orden de id.
+
+    - json: una página de hasta `limit` filas leídas (PAGINA_DEFECTO si se omite) y `next_after_id` para
+      pedir la siguiente (null al llegar al final).
+    - ndjson: streaming de todas las filas desde `after_id` (o solo `limit`
+      si se indica), pensado para exportar la tabla completa.
     """
-    rows = db.query(TradeData).limit(limit).all()
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato no válido (use 'json' o 'ndjson').")
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _exportar_ndjson(after_id, limit, bool(solo_con_coords)),
+            media_type="application/x-ndjson",
+        )
+
+    limit = PAGINA_DEFECTO if limit is None else limit
+    solo_con_coords = True if solo_con_coords is None else solo_con_coords
+    rows = db.execute(_consulta_flujos(after_id, limit)).all()
+    coords = _coordenadas_de(rows)
     flows = []
-    
     for row in rows:
-        o_lat, o_lng = get_coords(row.origin)
-        d_lat, d_lng = get_coords(row.destination)
-        
-        # Solo agregamos si tenemos coordenadas (útil para el mapa)
-        if o_lat and d_lat:
-            flows.append({
-                "origin": row.origin,
-                "destination": row.destination,
-                "product": row.product,
-                "total_price": float(row.total_price or 0),
-                "origin_lat": o_lat,
-                "origin_lng": o_lng,
-                "destination_lat": d_lat,
-                "destination_lng": d_lng,
-                "tariff": float(row.tariff or 0)
-            })
-            
-    return {"flows": flows}
+        flujo = _flujo_resumen(row, solo_con_coords, coords)
+        if flujo is not None:
+            flows.append(flujo)
+
+    # Se avanza por la última fila leída, aunque se haya descartado por coordenadas
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return {"flows": flows, "next_after_id": next_after_id}
@@ -1,5 +1,7 @@
 from typing import Optional
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.auth.schemas import UserCreate, UserOut
@@ -55,6 +57,12 @@ class UserService:
             return None
         return UserOut(id=user.id, username=user.username, email=user.email)
 
+    async def get_by_username_async(self, db: AsyncSession, username: str) -> Optional[UserOut]:
+        user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+        if not user:
+            return None
+        return UserOut(id=user.id, username=user.username, email=user.email)
+
     # Usuarios OAuth (Google)
     def create_or_get_oauth_user(self, db: Session, username: str, email: str) -> UserOut:
         """
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# Caches en disco compartidos entre workers (tablas FW, jerarquías CH): tras
+# /grafo/recargar cada worker puede quedar en una versión distinta del grafo,
+# así que nunca se borra lo que alguien usó (mtime) en este tiempo
+DISCO_GRACIA_S = float(os.getenv("ECOROUTE_CACHE_GRACIA_S", "600"))
+
+
+class CacheLRU:
+    """
+    Cache en memoria acotado (LRU) y seguro entre hilos.
+    Con `ttl` (segundos) las entradas además caducan.
+    """
+
+    def __init__(self, max_items: int, ttl: Optional[float] = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave: Hashable) -> Any:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def put(self, clave: Hashable, valor: Any) -> None:
+        expira = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def obtener(self, clave: Hashable, construir: Callable[[], Any]) -> Any:
+        valor = self.get(clave)
+        if valor is None:
+            valor = construir()
+            self.put(clave, valor)
+        return valor
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """True si la cabecera If-None-Match incluye `etag` (o es '*')."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
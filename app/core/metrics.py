@@ -0,0 +1,270 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# Mediciones de la petición en curso. Es un dict mutable: los hilos del
+# threadpool reciben una copia del contexto pero comparten el mismo dict.
+_medicion: ContextVar[Optional[dict]] = ContextVar("medicion", default=None)
+
+BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ------------------------------
+# Etapas de la petición actual
+# ------------------------------
+
+def _nueva_medicion() -> dict:
+    return {"etapas": {}, "etiquetas": {}, "bd_consultas": 0, "bd_s": 0.0, "abierta": None, "pila": []}
+
+
+@contextmanager
+def etapa(nombre: str):
+    """
+    Suma el tiempo del bloque a la etapa `nombre` de la petición actual.
+    Las etapas anidadas se descuentan de la que las contiene, así que la
+    suma de etapas nunca cuenta dos veces el mismo tiempo. También sirve
+    como decorador.
+    """
+    medicion = _medicion.get()
+    if medicion is None:
+        yield
+        return
+    pila = medicion["pila"]
+    marco = [0.0]   # tiempo de las etapas hijas
+    pila.append(marco)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        pila.pop()
+        if pila:
+            pila[-1][0] += duracion
+        etapas = medicion["etapas"]
+        etapas[nombre] = etapas.get(nombre, 0.0) + duracion - marco[0]
+
+
+def abrir_etapa(nombre: str) -> None:
+    """
+    Etapa que termina cuando sale la respuesta (la cierra el middleware).
+    Sirve para medir lo que FastAPI hace después del handler, como serializar.
+    """
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion["abierta"] = (nombre, time.perf_counter())
+
+
+def etiquetar(**etiquetas: str) -> None:
+    """Etiquetas para las métricas de la petición (algoritmo, criterio...)."""
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion["etiquetas"].update({k: str(v) for k, v in etiquetas.items()})
+
+
+# ------------------------------
+# Consultas a la BD
+# ------------------------------
+
+def instalar_contador_bd(engine) -> None:
+    """Cuenta consultas y tiempo en BD por petición (sync_engine si es async)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("_inicio_consulta")
+        duracion = time.perf_counter() - inicios.pop() if inicios else 0.0
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion["bd_consultas"] += 1
+            medicion["bd_s"] += duracion
+        consultas_bd.inc(duracion)
+
+
+# ------------------------------
+# Histogramas y exposición estilo Prometheus
+# ------------------------------
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas_texto(nombres: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...], buckets=BUCKETS_S):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *etiquetas: str) -> None:
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * len(self.buckets), 0, 0.0]
+            i = bisect_left(self.buckets, valor)
+            if i < len(self.buckets):
+                serie[0][i] += 1
+            serie[1] += 1
+            serie[2] += valor
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for etiquetas, (conteos, total, suma) in sorted(series.items()):
+            acumulado = 0
+            for limite, n in zip(self.buckets, conteos):
+                acumulado += n
+                le = _etiquetas_texto(self.etiquetas, etiquetas, f'le="{limite}"')
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            le = _etiquetas_texto(self.etiquetas, etiquetas, 'le="+Inf"')
+            lineas.append(f"{self.nombre}_bucket{le} {total}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas_texto(self.etiquetas, etiquetas)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas_texto(self.etiquetas, etiquetas)} {total}")
+        return lineas
+
+
+class ContadorTiempo:
+    """Contador de eventos y segundos acumulados (sin etiquetas)."""
+
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.total = 0
+        self.segundos = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, segundos: float) -> None:
+        with self._lock:
+            self.total += 1
+            self.segundos += segundos
+
+    def exponer(self) -> List[str]:
+        return [
+            f"# HELP {self.nombre}_total {self.ayuda}",
+            f"# TYPE {self.nombre}_total counter",
+            f"{self.nombre}_total {self.total}",
+            f"# TYPE {self.nombre}_segundos_total counter",
+            f"{self.nombre}_segundos_total {self.segundos}",
+        ]
+
+
+peticiones = Histograma(
+    "ecoroute_peticion_segundos",
+    "Duración de las peticiones HTTP",
+    ("ruta", "metodo", "estado", "algoritmo", "criterio"),
+)
+etapas = Histograma(
+    "ecoroute_etapa_segundos",
+    "Duración por etapa (carga del grafo, pesos, búsqueda, reconstrucción, serialización)",
+    ("etapa", "ruta", "algoritmo", "criterio"),
+)
+consultas_por_peticion = Histograma(
+    "ecoroute_consultas_bd_por_peticion",
+    "Consultas a la BD hechas por cada petición",
+    ("ruta",),
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+consultas_bd = ContadorTiempo("ecoroute_consultas_bd", "Consultas a la BD")
+
+
+def exponer_pools(pools: Dict[str, "object"]) -> List[str]:
+    """Gauges/contadores de MetricasPool (ver app/core/pool.py)."""
+    lineas = []
+    resumenes = {nombre: m.resumen() for nombre, m in pools.items()}
+    campos = sorted({campo for r in resumenes.values() for campo in r})
+    for campo in campos:
+        nombre = f"ecoroute_pool_{campo}"
+        lineas.append(f"# TYPE {nombre} gauge")
+        for pool, resumen in resumenes.items():
+            if campo in resumen:
+                lineas.append(f'{nombre}{{pool="{pool}"}} {resumen[campo]}')
+    return lineas
+
+
+def exponer(pools: Optional[Dict[str, object]] = None) -> str:
+    lineas: List[str] = []
+    for metrica in (peticiones, etapas, consultas_por_peticion, consultas_bd):
+        lineas.extend(metrica.exponer())
+    if pools:
+        lineas.extend(exponer_pools(pools))
+    return "\n".join(lineas) + "\n"
+
+
+# ------------------------------
+# Middleware ASGI
+# ------------------------------
+
+class MiddlewareTiempos:
+    """
+    Mide cada petición HTTP, agrega la cabecera Server-Timing con las
+    etapas registradas y alimenta los histogramas de /metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = _nueva_medicion()
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        estado = {"codigo": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+                abierta = medicion["abierta"]
+                if abierta:
+                    nombre, desde = abierta
+                    medicion["etapas"][nombre] = medicion["etapas"].get(nombre, 0.0) + time.perf_counter() - desde
+                    medicion["abierta"] = None
+                total = time.perf_counter() - inicio
+                cabeceras = list(mensaje.get("headers", []))
+                cabeceras.append((b"server-timing", _server_timing(medicion, total).encode("latin-1")))
+                mensaje = {**mensaje, "headers": cabeceras}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _medicion.reset(token)
+            _registrar(scope, medicion, estado["codigo"], time.perf_counter() - inicio)
+
+
+def _server_timing(medicion: dict, total: float) -> str:
+    partes = [f"{nombre};dur={segundos * 1000:.2f}" for nombre, segundos in medicion["etapas"].items()]
+    if medicion["bd_consultas"]:
+        partes.append(f'bd;desc="{medicion["bd_consultas"]} consultas";dur={medicion["bd_s"] * 1000:.2f}')
+    partes.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(partes)
+
+
+def _registrar(scope, medicion: dict, codigo: int, total: float) -> None:
+    # Plantilla de la ruta ("/reports/{report_id}/hide"), no la URL: cardinalidad acotada
+    ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+    algoritmo = medicion["etiquetas"].get("algoritmo", "")
+    criterio = medicion["etiquetas"].get("criterio", "")
+    peticiones.observar(total, ruta, scope.get("method", ""), str(codigo), algoritmo, criterio)
+    for nombre, segundos in medicion["etapas"].items():
+        etapas.observar(segundos, nombre, ruta, algoritmo, criterio)
+    consultas_por_peticion.observar(medicion["bd_consultas"], ruta)
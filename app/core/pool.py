@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+def _env_bool(nombre: str, defecto: bool) -> bool:
+    valor = os.getenv(nombre)
+    if valor is None:
+        return defecto
+    return valor.strip().lower() in ("1", "true", "yes", "si", "sí")
+
+
+def opciones_pool() -> dict:
+    """
+    Parámetros del pool desde el entorno. Conviene que
+    DB_POOL_SIZE + DB_MAX_OVERFLOW, multiplicado por el número de workers,
+    no supere el máximo de conexiones del servidor MySQL.
+    """
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Reciclar antes de que el servidor cierre conexiones inactivas
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        # Con pre-ping cada checkout hace un viaje extra a la BD; sin él,
+        # una conexión caída se detecta al usarla y se invalida el pool
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+
+
+class MetricasPool:
+    """Contadores de un pool de conexiones (seguro entre hilos)."""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.engine = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.conexiones_abiertas = 0
+        self.invalidaciones = 0
+        self.timeouts = 0
+        self.espera_total_s = 0.0
+        self.espera_max_s = 0.0
+
+    def registrar_espera(self, segundos: float) -> None:
+        with self._lock:
+            self.espera_total_s += segundos
+            self.espera_max_s = max(self.espera_max_s, segundos)
+
+    def registrar_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def instalar(self, engine) -> None:
+        """Escucha los eventos del pool de `engine` (sync_engine si es async)."""
+        self.engine = engine
+
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_con, registro):
+            with self._lock:
+                self.conexiones_abiertas += 1
+
+        @event.listens_for(engine, "close")
+        def _close(dbapi_con, registro):
+            with self._lock:
+                self.conexiones_abiertas -= 1
+
+        @event.listens_for(engine, "checkout")
+        def _checkout(dbapi_con, registro, proxy):
+            with self._lock:
+                self.checkouts += 1
+                self.en_uso += 1
+                self.max_en_uso = max(self.max_en_uso, self.en_uso)
+
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_con, registro):
+            with self._lock:
+                self.en_uso = max(self.en_uso - 1, 0)
+
+        @event.listens_for(engine, "invalidate")
+        def _invalidate(dbapi_con, registro, excepcion):
+            with self._lock:
+                self.invalidaciones += 1
+
+    def resumen(self) -> Dict[str, object]:
+        with self._lock:
+            datos = {
+                "checkouts": self.checkouts,
+                "en_uso": self.en_uso,
+                "max_en_uso": self.max_en_uso,
+                "conexiones_abiertas": self.conexiones_abiertas,
+                "invalidaciones": self.invalidaciones,
+                "timeouts": self.timeouts,
+                "espera_total_ms": round(self.espera_total_s * 1000, 3),
+                "espera_media_ms": round(self.espera_total_s * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "espera_max_ms": round(self.espera_max_s * 1000, 3),
+            }
+        # engine.dispose() reemplaza el pool: siempre el actual
+        pool = self.engine.pool if self.engine is not None else None
+        if pool is not None and hasattr(pool, "size"):
+            datos.update({
+                "pool_size": pool.size(),
+                "disponibles": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return datos
+
+
+def _clase_medida(base, metricas: MetricasPool):
+    """
+    Subclase de `base` que mide cuánto tarda cada checkout en obtener una
+    conexión (espera en la cola + abrirla si hace falta). Se guarda en la
+    clase para que sobreviva a engine.dispose(), que recrea el pool.
+    """
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return base._do_get(self)
+        except exc.TimeoutError:
+            metricas.registrar_timeout()
+            raise
+        finally:
+            metricas.registrar_espera(time.perf_counter() - inicio)
+
+    return type(f"{base.__name__}Medido", (base,), {"_do_get": _do_get})
+
+
+def pool_medido(metricas: MetricasPool):
+    return _clase_medida(QueuePool, metricas)
+
+
+def pool_async_medido(metricas: MetricasPool):
+    return _clase_medida(AsyncAdaptedQueuePool, metricas)
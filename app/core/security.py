@@ -5,10 +5,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 
-from app.database import get_db
+from app.database import get_async_db
 
 # === Configuración JWT ===
 
@@ -24,6 +24,9 @@ pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
+# Igual, pero sin 401 si no viene token (endpoints públicos)
+oauth2_scheme_opcional = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
+
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -45,7 +48,7 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Obtiene el usuario autenticado desde un JWT.
@@ -71,7 +74,7 @@ async def get_current_user(
         raise cred_exception
 
     # Obtener usuario REAL desde MySQL
-    user = user_service.get_by_username(db, username)
+    user = await user_service.get_by_username_async(db, username)
     if user:
         return user
 
@@ -81,3 +84,52 @@ async def get_current_user(
         username=username,
         email=f"{username}@virtual.local"
     )
+
+
+# Usuarios que pueden usar endpoints de operación (p. ej. /grafo/recargar),
+# separados por coma. Vacío: nadie (el registro es abierto).
+ADMIN_USERS = {u.strip() for u in os.getenv("ECOROUTE_ADMIN_USERS", "").split(",") if u.strip()}
+
+
+async def get_admin_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Como get_current_user, pero sin usuario virtual: el token tiene que ser
+    de una fila real de `users` que además esté en ECOROUTE_ADMIN_USERS.
+    Sin esa lista no pasa nadie.
+    """
+    from app.auth.service import user_service
+
+    try:
+        username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        username = None
+    if not username:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudieron validar las credenciales",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = await user_service.get_by_username_async(db, username)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Se requiere un usuario registrado.")
+    if user.username not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operación reservada a administradores.")
+    return user
+
+
+def get_username_opcional(token: Optional[str] = Depends(oauth2_scheme_opcional)) -> Optional[str]:
+    """
+    Username del JWT si viene uno válido; None en otro caso.
+    No consulta la BD: sirve para personalizar endpoints públicos.
+    """
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub") or None
@@ -1,15 +1,41 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from contextlib import asynccontextmanager
+import asyncio
 import traceback
 
 from app.auth.routes import router as auth_router
+from app.core.metrics import MiddlewareTiempos, exponer as exponer_metricas
+from app.database import metricas_pool, metricas_pool_async
 from app.api.endpoints import router as rutas_router  # 👈 tu router actual (grafos, etc)
 from app.api.trade_flows import router as trade_flows_router  # 👈 NUEVO
 from app.reports import routes as reports_routes
+from app.routing_config.routes import router as graph_config_router
+from app.services.calentamiento import calentar, estado as estado_calentamiento
+from app.services.agregados_comercio import vista_agregados
+from app.services.opciones_comercio import vista_opciones
+from app.services.vista_incremental import refrescar_periodicamente
 
-app = FastAPI(title="EcoRoute API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Grafo, tablas y opciones se precalculan en segundo plano; /ready
+    # responde 503 hasta que termina, así el balanceador espera al worker
+    tareas = [
+        asyncio.create_task(calentar()),
+        # Mantienen al día las vistas en memoria de trade_data
+        asyncio.create_task(refrescar_periodicamente(vista_opciones)),
+        asyncio.create_task(refrescar_periodicamente(vista_agregados)),
+    ]
+    yield
+    for tarea in tareas:
+        if not tarea.done():
+            tarea.cancel()
+
+
+app = FastAPI(title="EcoRoute API", lifespan=lifespan)
 
 # SessionMiddleware para OAuth (Google)
 app.add_middleware(
@@ -36,10 +62,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tiempos por etapa (Server-Timing) y métricas para /metrics
+app.add_middleware(MiddlewareTiempos)
+
 # Routers
 app.include_router(auth_router)
 app.include_router(rutas_router)         # 👈 aquí sigues teniendo TODO lo de /ruta-optima, Dijkstra, etc
 app.include_router(trade_flows_router)   # 👈 endpoints para dataset.xlsx y mapa de flows
+app.include_router(graph_config_router)  # nodos/rutas personalizados por usuario
 
 
 @app.get("/health")
@@ -47,6 +77,28 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def readiness_check():
+    # /health dice si el proceso vive; /ready si ya puede recibir tráfico
+    resumen = estado_calentamiento.resumen()
+    return JSONResponse(status_code=200 if estado_calentamiento.listo else 503, content=resumen)
+
+
+@app.get("/health/pool")
+def pool_metrics():
+    # Uso de los pools de conexiones (para dimensionarlos según los workers)
+    return {
+        "sync": metricas_pool.resumen(),
+        "async": metricas_pool_async.resumen(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Formato de texto de Prometheus
+    return exponer_metricas({"sync": metricas_pool, "async": metricas_pool_async})
+
+
 @app.get("/favicon.ico")
 async def favicon():
     # evita error de favicon en consola
@@ -1,8 +1,10 @@
+import hashlib
 import json
 import os
-from typing import Dict, List
+from array import array
+from typing import Any, Callable, Dict, Hashable, Iterable, List
 from .nodo import Nodo
-from .ruta import Ruta
+from .ruta import Ruta, TIPOS_TRANSPORTE
 from .producto import Producto
 from sqlalchemy import select
 from app.models.ruta_model import RutaModel
@@ -10,19 +12,48 @@ from app.models.pais_model import PaisModel
 
 
 class GrafoRutas:
+    """
+    Grafo dirigido de rutas.
+
+    Internamente los nodos se internan a índices enteros y la adyacencia
+    se guarda en formato CSR: las aristas que salen del nodo `u` son las
+    posiciones `offsets[u] .. offsets[u + 1] - 1` de los arrays paralelos
+    (`destinos`, `distancia_km`, `tiempo_horas`, `costo_base_usd_ton`,
+    `modos`). Los objetos `Ruta` solo se crean cuando alguien los pide
+    (`vecinos`, `ruta`).
+    """
 
     def __init__(self):
         self.nodos: Dict[str, Nodo] = {}
-        self.adyacencia: Dict[str, List[Ruta]] = {}
         self.productos: Dict[str, Producto] = {}
+        self.version: str = ""
+
+        # Tabla de tipos de transporte: el tipo tipos[i] ocupa el bit i
+        self.tipos: List[str] = list(TIPOS_TRANSPORTE)
+
+        # Representación compacta
+        self.ids: List[str] = []
+        self.indice: Dict[str, int] = {}
+        self.offsets = array("l", [0])
+        self.origenes = array("l")
+        self.destinos = array("l")
+        self.distancia_km = array("d")
+        self.tiempo_horas = array("d")
+        self.costo_base_usd_ton = array("d")
+        self.modos = array("H")
+
+        # Estructuras derivadas (pesos por criterio, etc.) de esta versión
+        self.derivados: Dict[Hashable, Any] = {}
 
     def cargar_desde_bd(self, db):
         self.nodos = {}
-        self.adyacencia = {}
         self.productos = {}
+        rutas_leidas: List[Ruta] = []
 
         # 1. Cargar países
-        paises = db.execute(select(PaisModel)).scalars().all()
+        # Orden fijo: los índices internos de nodos y aristas dependen del orden
+        # de lectura, y las tablas compartidas entre workers (FW, CH) usan esos índices
+        paises = db.execute(select(PaisModel).order_by(PaisModel.id)).scalars().all()
         for p in paises:
             self.nodos[p.id] = Nodo(
                 id=p.id,
@@ -30,31 +61,30 @@ class GrafoRutas:
                 lat=p.lat,
                 lon=p.lon
             )
-            self.adyacencia[p.id] = []   # correcta indentación
 
         # 2. Cargar rutas
-        rutas = db.execute(select(RutaModel)).scalars().all()
+        rutas = db.execute(select(RutaModel).order_by(RutaModel.id)).scalars().all()
         for r in rutas:
 
             # nodos faltantes
             if r.origen_id not in self.nodos:
                 self.nodos[r.origen_id] = Nodo(r.origen_id, r.origen_id, 0, 0)
-                self.adyacencia[r.origen_id] = []
 
             if r.destino_id not in self.nodos:
                 self.nodos[r.destino_id] = Nodo(r.destino_id, r.destino_id, 0, 0)
-                self.adyacencia[r.destino_id] = []
-
-            ruta = Ruta(
-                origen=r.origen_id,
-                destino=r.destino_id,
-                tipo=r.tipo,
-                distancia_km=r.distancia_km,
-                tiempo_horas=r.tiempo_horas,
-                costo_base_usd_ton=r.costo_base_usd_ton,
+
+            rutas_leidas.append(
+                Ruta(
+                    origen=r.origen_id,
+                    destino=r.destino_id,
+                    tipo=r.tipo,
+                    distancia_km=r.distancia_km,
+                    tiempo_horas=r.tiempo_horas,
+                    costo_base_usd_ton=r.costo_base_usd_ton,
+                )
             )
 
-            self.adyacencia[r.origen_id].append(ruta)
+        self._construir_csr(rutas_leidas)
 
     # ------------------------------
     # JSON loader (si aplicara)
@@ -67,6 +97,9 @@ class GrafoRutas:
         with open(ruta_archivo, "r", encoding="utf-8") as f:
             data = json.load(f)
 
+        # Conservamos lo que ya estuviera cargado
+        rutas_leidas: List[Ruta] = [self.ruta(e) for e in range(len(self.destinos))]
+
         for p in data.get("paises", []):
             nodo = Nodo(
                 id=p["id"],
@@ -75,8 +108,6 @@ class GrafoRutas:
                 lon=p["lon"],
             )
             self.nodos[nodo.id] = nodo
-            if nodo.id not in self.adyacencia:
-                self.adyacencia[nodo.id] = []
 
         for pr in data.get("productos", []):
             producto = Producto(
@@ -91,22 +122,174 @@ class GrafoRutas:
             self.productos[producto.id] = producto
 
         for r in data.get("rutas", []):
-            ruta = Ruta(
-                origen=r["origen"],
-                destino=r["destino"],
-                tipo=r["tipo"],
-                distancia_km=float(r["distancia_km"]),
-                tiempo_horas=float(r["tiempo_horas"]),
-                costo_base_usd_ton=float(r["costo_base_usd_ton"]),
+            rutas_leidas.append(
+                Ruta(
+                    origen=r["origen"],
+                    destino=r["destino"],
+                    tipo=r["tipo"],
+                    distancia_km=float(r["distancia_km"]),
+                    tiempo_horas=float(r["tiempo_horas"]),
+                    costo_base_usd_ton=float(r["costo_base_usd_ton"]),
+                )
             )
-            if ruta.origen not in self.adyacencia:
-                self.adyacencia[ruta.origen] = []
-            self.adyacencia[ruta.origen].append(ruta)
+
+        self._construir_csr(rutas_leidas)
+
+    # ------------------------------
+    # Representación compacta (CSR)
+    # ------------------------------
+
+    def _construir_csr(self, rutas: List[Ruta]) -> None:
+        # Internado de nodos: primero los conocidos, luego los que solo
+        # aparecen como origen de alguna ruta (cargar_desde_json)
+        self.ids = list(self.nodos.keys())
+        self.indice = {nodo_id: i for i, nodo_id in enumerate(self.ids)}
+        for r in rutas:
+            if r.origen not in self.indice:
+                self.indice[r.origen] = len(self.ids)
+                self.ids.append(r.origen)
+
+        n = len(self.ids)
+        grado = [0] * (n + 1)
+        for r in rutas:
+            grado[self.indice[r.origen] + 1] += 1
+        for i in range(n):
+            grado[i + 1] += grado[i]
+        self.offsets = array("l", grado)
+
+        # Counting sort estable: cada nodo conserva el orden de sus rutas
+        m = len(rutas)
+        orden = [0] * m
+        siguiente = list(grado[:n])
+        for k, r in enumerate(rutas):
+            u = self.indice[r.origen]
+            orden[siguiente[u]] = k
+            siguiente[u] += 1
+
+        self.origenes = array("l", (self.indice[rutas[k].origen] for k in orden))
+        self.destinos = array("l", (self._indice_destino(rutas[k].destino) for k in orden))
+        self.distancia_km = array("d", (rutas[k].distancia_km for k in orden))
+        self.tiempo_horas = array("d", (rutas[k].tiempo_horas for k in orden))
+        self.costo_base_usd_ton = array("d", (rutas[k].costo_base_usd_ton for k in orden))
+        self.modos = array("H", (self._bit_tipo(rutas[k].tipo) for k in orden))
+
+        self.version = self._calcular_version()
+        self.derivados = {}
+
+    def _indice_destino(self, nodo_id: str) -> int:
+        # Destinos que no son nodos (solo posible desde JSON) se internan al final
+        if nodo_id not in self.indice:
+            self.indice[nodo_id] = len(self.ids)
+            self.ids.append(nodo_id)
+            self.offsets.append(self.offsets[-1])
+        return self.indice[nodo_id]
+
+    def _bit_tipo(self, tipo: str) -> int:
+        if tipo not in self.tipos:
+            if len(self.tipos) >= 16:
+                raise ValueError(f"Demasiados tipos de transporte distintos (tipo '{tipo}').")
+            self.tipos.append(tipo)
+        return 1 << self.tipos.index(tipo)
+
+    def mascara(self, tipos: Iterable[str]) -> int:
+        """Máscara de bits con los tipos de transporte indicados."""
+        m = 0
+        for tipo in tipos:
+            if tipo in self.tipos:
+                m |= 1 << self.tipos.index(tipo)
+        return m
+
+    def mascara_todos(self) -> int:
+        return (1 << len(self.tipos)) - 1
+
+    def _calcular_version(self) -> str:
+        """
+        Huella del contenido del grafo (nodos + rutas) y de su disposición.
+        Se recorre en orden de índice interno: la versión es la clave de las
+        tablas compartidas entre procesos (FW, CH), que guardan índices de
+        nodo y de arista, así que dos procesos con la misma versión deben
+        tener además los mismos índices.
+        """
+        h = hashlib.sha1()
+        h.update(("T|" + "|".join(self.tipos) + "\n").encode("utf-8"))
+        for nodo_id in self.ids:
+            n = self.nodos.get(nodo_id)
+            lat, lon = (n.lat, n.lon) if n else (None, None)
+            h.update(f"N|{nodo_id}|{lat}|{lon}\n".encode("utf-8"))
+        for e in range(self.num_aristas()):
+            h.update(
+                f"R|{self.origenes[e]}|{self.destinos[e]}|{self.modos[e]}|{self.distancia_km[e]}|"
+                f"{self.tiempo_horas[e]}|{self.costo_base_usd_ton[e]}\n".encode("utf-8")
+            )
+        return h.hexdigest()[:16]
+
+    def derivado(self, clave: Hashable, construir: Callable[[], Any]) -> Any:
+        """
+        Devuelve una estructura derivada del grafo, construyéndola la
+        primera vez. Como viven en la propia instancia, desaparecen junto
+        con el snapshot cuando el grafo se recarga.
+        """
+        valor = self.derivados.get(clave)
+        if valor is None:
+            valor = self.derivados.setdefault(clave, construir())
+        return valor
 
     # Helpers
 
+    def num_nodos(self) -> int:
+        return len(self.ids)
+
+    def num_aristas(self) -> int:
+        return len(self.destinos)
+
+    def aristas_de(self, u: int) -> range:
+        """Índices de las aristas que salen del nodo interno `u`."""
+        return range(self.offsets[u], self.offsets[u + 1])
+
+    def aristas_entrantes(self, v: int):
+        """Índices de las aristas que llegan al nodo interno `v` (CSR inverso)."""
+        offsets_inv, aristas_inv = self.derivado("inverso", self._construir_csr_inverso)
+        return aristas_inv[offsets_inv[v]:offsets_inv[v + 1]]
+
+    def _construir_csr_inverso(self):
+        n = self.num_nodos()
+        grado = [0] * (n + 1)
+        for v in self.destinos:
+            grado[v + 1] += 1
+        for i in range(n):
+            grado[i + 1] += grado[i]
+
+        aristas_inv = array("l", [0] * len(self.destinos))
+        siguiente = list(grado[:n])
+        for e, v in enumerate(self.destinos):
+            aristas_inv[siguiente[v]] = e
+            siguiente[v] += 1
+        return array("l", grado), aristas_inv
+
+    def tipo_de(self, e: int) -> str:
+        return self.tipos[self.modos[e].bit_length() - 1]
+
+    def ruta(self, e: int) -> Ruta:
+        """Materializa la arista `e` como objeto Ruta."""
+        return Ruta(
+            origen=self.ids[self.origenes[e]],
+            destino=self.ids[self.destinos[e]],
+            tipo=self.tipo_de(e),
+            distancia_km=self.distancia_km[e],
+            tiempo_horas=self.tiempo_horas[e],
+            costo_base_usd_ton=self.costo_base_usd_ton[e],
+        )
+
+    @property
+    def adyacencia(self) -> Dict[str, List[Ruta]]:
+        # Compatibilidad: vista dict construida bajo demanda
+        return {nodo_id: self.vecinos(nodo_id) for nodo_id in self.ids}
+
     def vecinos(self, nodo_id: str) -> List[Ruta]:
-        return self.adyacencia.get(nodo_id, [])
+        u = self.indice.get(nodo_id)
+        if u is None:
+            return []
+        return [self.ruta(e) for e in self.aristas_de(u)]
 
     def validar_pais(self, pais_id: str) -> bool:
         return pais_id in self.nodos
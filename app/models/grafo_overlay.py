@@ -0,0 +1,174 @@
+import hashlib
+import math
+from array import array
+from collections import ChainMap
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Sequence
+
+from .grafo import GrafoRutas
+from .nodo import Nodo
+from .ruta import Ruta
+
+
+class VistaConcatenada(Sequence):
+    """
+    Secuencia de solo lectura `base + extra` sin copiar `base`.
+    Los índices >= len(base) caen en `extra`.
+    """
+
+    __slots__ = ("base", "extra", "_n")
+
+    def __init__(self, base: Sequence, extra: Sequence):
+        self.base = base
+        self.extra = extra
+        self._n = len(base)
+
+    def __len__(self) -> int:
+        return self._n + len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < self._n:
+            return self.base[i]
+        return self.extra[i - self._n]
+
+    def __iter__(self):
+        yield from self.base
+        yield from self.extra
+
+
+def _pesos_validos(r: Ruta) -> bool:
+    """
+    Dijkstra, CH, Floyd-Warshall y Yen suponen pesos finitos y no negativos:
+    un ciclo negativo puede colgar una búsqueda. Los logs viejos pueden
+    traer rutas guardadas antes de validar el esquema; se ignoran.
+    """
+    pesos = (r.distancia_km, r.tiempo_horas, r.costo_base_usd_ton)
+    if all(math.isfinite(p) and p >= 0 for p in pesos):
+        return True
+    print(f"⚠️ Ruta personalizada {r.origen}->{r.destino} ignorada: pesos inválidos {pesos}")
+    return False
+
+
+class GrafoOverlay:
+    """
+    Personalizaciones de un usuario encima del grafo compartido.
+
+    Guarda solo los nodos y aristas extra; todo lo demás se lee del grafo
+    base sin copiarlo. Los nodos nuevos reciben índices a partir de
+    base.num_nodos() y las aristas nuevas a partir de base.num_aristas(),
+    así que los índices del grafo base siguen siendo válidos y las
+    búsquedas funcionan igual que sobre un GrafoRutas.
+    """
+
+    def __init__(self, base: GrafoRutas, nodos: Iterable[Nodo], rutas: Iterable[Ruta], revision: str = ""):
+        self.base = base
+        self.productos = base.productos
+        self.tipos = base.tipos
+        self.derivados: Dict[Hashable, Any] = {}
+
+        # Nodos: los del usuario tapan a los del grafo base (mismo índice)
+        nodos_extra: Dict[str, Nodo] = {n.id: n for n in nodos}
+        rutas = [r for r in rutas if _pesos_validos(r)]
+        for r in rutas:
+            for nodo_id in (r.origen, r.destino):
+                if nodo_id not in nodos_extra and nodo_id not in base.nodos:
+                    nodos_extra[nodo_id] = Nodo(nodo_id, nodo_id, 0, 0)
+        self.nodos = ChainMap(nodos_extra, base.nodos)
+
+        ids_extra = [nodo_id for nodo_id in nodos_extra if nodo_id not in base.indice]
+        self.ids = VistaConcatenada(base.ids, ids_extra)
+        self.indice = ChainMap(
+            {nodo_id: base.num_nodos() + i for i, nodo_id in enumerate(ids_extra)},
+            base.indice,
+        )
+
+        # Aristas extra, con los mismos arrays paralelos que el grafo base
+        m0 = base.num_aristas()
+        self.rutas_extra = rutas
+        self._salientes: Dict[int, List[int]] = {}
+        self._entrantes: Dict[int, List[int]] = {}
+        origenes = array("l")
+        destinos = array("l")
+        for k, r in enumerate(rutas):
+            u, v = self.indice[r.origen], self.indice[r.destino]
+            origenes.append(u)
+            destinos.append(v)
+            self._salientes.setdefault(u, []).append(m0 + k)
+            self._entrantes.setdefault(v, []).append(m0 + k)
+
+        self.origenes = VistaConcatenada(base.origenes, origenes)
+        self.destinos = VistaConcatenada(base.destinos, destinos)
+        self.distancia_km = VistaConcatenada(base.distancia_km, array("d", (r.distancia_km for r in rutas)))
+        self.tiempo_horas = VistaConcatenada(base.tiempo_horas, array("d", (r.tiempo_horas for r in rutas)))
+        self.costo_base_usd_ton = VistaConcatenada(
+            base.costo_base_usd_ton, array("d", (r.costo_base_usd_ton for r in rutas))
+        )
+        self.modos = VistaConcatenada(base.modos, array("H", (base.mascara([r.tipo]) for r in rutas)))
+
+        huella = hashlib.sha1(f"{revision}|{len(nodos_extra)}|{len(rutas)}".encode("utf-8"))
+        self.version = f"{base.version}+{huella.hexdigest()[:8]}"
+
+    # Misma interfaz que GrafoRutas
+
+    def num_nodos(self) -> int:
+        return len(self.ids)
+
+    def num_aristas(self) -> int:
+        return len(self.destinos)
+
+    def num_aristas_base(self) -> int:
+        return self.base.num_aristas()
+
+    def aristas_de(self, u: int):
+        extra = self._salientes.get(u)
+        if u >= self.base.num_nodos():
+            return extra or []
+        if extra:
+            return list(self.base.aristas_de(u)) + extra
+        return self.base.aristas_de(u)
+
+    def aristas_entrantes(self, v: int):
+        extra = self._entrantes.get(v)
+        if v >= self.base.num_nodos():
+            return extra or []
+        if extra:
+            return list(self.base.aristas_entrantes(v)) + extra
+        return self.base.aristas_entrantes(v)
+
+    def tipo_de(self, e: int) -> str:
+        return self.tipos[self.modos[e].bit_length() - 1]
+
+    def ruta(self, e: int) -> Ruta:
+        if e < self.base.num_aristas():
+            return self.base.ruta(e)
+        return self.rutas_extra[e - self.base.num_aristas()]
+
+    def derivado(self, clave: Hashable, construir: Callable[[], Any]) -> Any:
+        valor = self.derivados.get(clave)
+        if valor is None:
+            valor = self.derivados.setdefault(clave, construir())
+        return valor
+
+    def mascara(self, tipos: Iterable[str]) -> int:
+        return self.base.mascara(tipos)
+
+    def mascara_todos(self) -> int:
+        return self.base.mascara_todos()
+
+    def vecinos(self, nodo_id: str) -> List[Ruta]:
+        u = self.indice.get(nodo_id)
+        if u is None:
+            return []
+        return [self.ruta(e) for e in self.aristas_de(u)]
+
+    def validar_pais(self, pais_id: str) -> bool:
+        return pais_id in self.nodos
+
+    def obtener_nodos(self) -> List[str]:
+        return list(self.nodos.keys())
+
+    def obtener_producto(self, producto_id: str):
+        return self.productos.get(producto_id)
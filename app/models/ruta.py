@@ -1,5 +1,10 @@
 from dataclasses import dataclass
 
+# Tipos de transporte conocidos. El orden define el bit de cada tipo
+# en la máscara que usa la representación compacta del grafo.
+TIPOS_TRANSPORTE = ["aerea", "maritima", "terrestre", "mixta"]
+
+
 @dataclass
 class Ruta:
     origen: str
@@ -3,8 +3,8 @@ from typing import List, Literal, Optional
 
 
 class RutaOptimaRequest(BaseModel):
-    algoritmo: Literal["dijkstra", "floyd-warshall"]
-    criterio: Literal["rapidez", "economia"]
+    algoritmo: Literal["dijkstra", "floyd-warshall", "astar", "bidireccional", "ch"]
+    criterio: Literal["rapidez", "economia", "pareto"]
     origen: str = Field(..., description="ID de país origen, ej. PER")
     destino: str = Field(..., description="ID de país destino, ej. CHN")
     producto_id: Optional[str] = Field(
@@ -1,11 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 class TradeData(Base):
     __tablename__ = "trade_data"
-    __table_args__ = {"schema": "trade"}   # 👈👈 MUY IMPORTANTE
+    __table_args__ = (
+        # Respalda /api/trade-flow-detail(s): filtran por los tres campos.
+        # No hay migraciones; en una BD existente se crea con
+        #   CREATE INDEX ix_trade_data_origen_destino_producto
+        #       ON trade.trade_data (origin, destination, product);
+        Index("ix_trade_data_origen_destino_producto", "origin", "destination", "product"),
+        {"schema": "trade"},   # 👈👈 MUY IMPORTANTE
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     origin = Column(String(100))
@@ -2,12 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from datetime import datetime
 from pydantic import BaseModel
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import get_current_user
 from app.auth.schemas import UserOut
-from app.database import get_db
+from app.database import get_async_db
 from app.models.analisis_resultados import AnalisisResultado
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
@@ -30,17 +30,18 @@ class ReportOut(ReportCreate):
 @router.get("/me", response_model=List[ReportOut])
 async def get_my_reports(
     current_user: UserOut = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     rows = (
-        db.query(AnalisisResultado)
-        .filter(
-            AnalisisResultado.user_id == current_user.id,
-            AnalisisResultado.hidden == False,
+        await db.execute(
+            select(AnalisisResultado)
+            .where(
+                AnalisisResultado.user_id == current_user.id,
+                AnalisisResultado.hidden == False,
+            )
+            .order_by(AnalisisResultado.created_at.asc())
         )
-        .order_by(AnalisisResultado.created_at.asc())
-        .all()
-    )
+    ).scalars().all()
 
     result: List[ReportOut] = []
     for r in rows:
@@ -65,10 +66,10 @@ async def get_my_reports(
 async def create_report(
     payload: ReportCreate,
     current_user: UserOut = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Como tu tabla NO es AUTO_INCREMENT en el DDL, calculamos el siguiente id
-    max_id = db.query(func.max(AnalisisResultado.id)).scalar() or 0
+    max_id = (await db.execute(select(func.max(AnalisisResultado.id)))).scalar() or 0
     new_id = max_id + 1
 
     now = datetime.utcnow()
@@ -85,8 +86,8 @@ async def create_report(
     )
 
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
 
     return ReportOut(
         id=row.id,
@@ -104,16 +105,16 @@ async def create_report(
 async def hide_report(
     report_id: int,
     current_user: UserOut = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     row = (
-        db.query(AnalisisResultado)
-        .filter(
-            AnalisisResultado.id == report_id,
-            AnalisisResultado.user_id == current_user.id,
+        await db.execute(
+            select(AnalisisResultado).where(
+                AnalisisResultado.id == report_id,
+                AnalisisResultado.user_id == current_user.id,
+            )
         )
-        .first()
-    )
+    ).scalars().first()
 
     if not row:
         raise HTTPException(
@@ -122,8 +123,8 @@ async def hide_report(
         )
 
     row.hidden = True
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
 
     return ReportOut(
         id=row.id,
@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal
+
+
+class CustomNode(BaseModel):
+    id: str = Field(..., description="ID del país/nodo, ej. PER, DEU, etc.")
+    nombre: str = Field(..., description="Nombre legible")
+    lat: float
+    lon: float
+
+
+class CustomRoute(BaseModel):
+    origen: str
+    destino: str
+    tipo: Literal["aerea", "maritima", "terrestre", "mixta"]
+    # Los motores de ruteo asumen pesos finitos y no negativos
+    distancia_km: float = Field(..., ge=0, allow_inf_nan=False)
+    tiempo_horas: float = Field(..., ge=0, allow_inf_nan=False)
+    costo_base_usd_ton: float = Field(..., ge=0, allow_inf_nan=False)
+
+
+class GraphConfig(BaseModel):
+    nodos: List[CustomNode] = []
+    rutas: List[CustomRoute] = []
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.cache import CacheLRU
+from app.routing_config.schemas import CustomNode, CustomRoute, GraphConfig
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se protege entre hilos del mismo proceso
+    fcntl = None
+
+# Por usuario: un log de cambios (JSON por línea) que solo crece y se
+# compacta de vez en cuando, y un archivo de lock para escribirlo.
+CUSTOM_GRAPH_DIR = Path("app/data/custom_graph")
+
+# Antes había un único archivo global compartido por todos los usuarios.
+# Se importa en el log de cada usuario que todavía no tiene uno.
+LEGACY_CUSTOM_GRAPH_PATH = Path("app/data/custom_graph.json")
+
+# Se compacta cuando el log tiene más de este número de líneas y más del
+# doble de las que quedarían después de compactar
+COMPACTAR_MIN_LINEAS = int(os.getenv("ECOROUTE_GRAPH_CONFIG_COMPACTAR", "256"))
+
+
+def _nombre_archivo(username: str) -> str:
+    # El username viene del token y es libre: un hash da un nombre de archivo
+    # válido y distinto para cada usuario (limpiar caracteres juntaba usuarios)
+    return hashlib.sha256(username.encode("utf-8")).hexdigest()
+
+
+def _nombre_anterior(username: str) -> Optional[str]:
+    """
+    Nombre de archivo de la versión anterior, solo si era el username tal
+    cual: los que se limpiaban ("a b" -> "a_b") pudieron mezclar usuarios
+    y no se migran.
+    """
+    limpio = re.sub(r"[^A-Za-z0-9_.@-]", "_", username).lstrip(".") or "_"
+    return limpio if limpio == username else None
+
+
+class _VistaConfig:
+    """
+    Estado en memoria del log de un usuario: nodos indexados por id y rutas
+    en orden de alta. Se pone al día leyendo solo lo agregado al log desde
+    la última lectura; si otro proceso lo compactó (cambia el inode), se
+    relee completo.
+    """
+
+    def __init__(self, username: str):
+        self.username = username
+        nombre = _nombre_archivo(username)
+        self.nombre_anterior = _nombre_anterior(username)
+        self.ruta_log = CUSTOM_GRAPH_DIR / f"{nombre}.log"
+        self.ruta_lock = CUSTOM_GRAPH_DIR / f"{nombre}.lock"
+        self.nodos: Dict[str, CustomNode] = {}
+        self.rutas: List[CustomRoute] = []
+        self.lineas = 0
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._legado_revisado = False
+
+    # ------------------------------
+    # Lectura
+    # ------------------------------
+
+    def _reiniciar(self) -> None:
+        self.nodos = {}
+        self.rutas = []
+        self.lineas = 0
+        self._offset = 0
+
+    def _aplicar(self, cambio: dict) -> None:
+        op = cambio.get("op")
+        if op == "node":
+            nodo = CustomNode(**cambio["data"])
+            # pop + insert deja el nodo actualizado al final, como antes
+            self.nodos.pop(nodo.id, None)
+            self.nodos[nodo.id] = nodo
+        elif op == "route":
+            self.rutas.append(CustomRoute(**cambio["data"]))
+        elif op == "reset":
+            self.nodos = {}
+            self.rutas = []
+        else:
+            raise ValueError(f"operación desconocida '{op}'")
+
+    def _leer_cola(self) -> None:
+        """Aplica las líneas nuevas del log (llamar con self._lock tomado)."""
+        try:
+            st = self.ruta_log.stat()
+        except FileNotFoundError:
+            self._inode = None
+            self._reiniciar()
+            return
+
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._inode = st.st_ino
+            self._reiniciar()
+        if st.st_size == self._offset:
+            return
+
+        with self.ruta_log.open("rb") as f:
+            f.seek(self._offset)
+            datos = f.read()
+
+        # Una línea a medio escribir se deja para la próxima lectura
+        fin = datos.rfind(b"\n") + 1
+        for num, linea in enumerate(datos[:fin].splitlines(), start=self.lineas + 1):
+            if not linea.strip():
+                continue
+            try:
+                self._aplicar(json.loads(linea))
+            except Exception as e:
+                # Una línea rota no invalida el resto del log
+                print(f"⚠️ {self.ruta_log}: línea {num} ignorada ({e})")
+        self.lineas += datos[:fin].count(b"\n")
+        self._offset += fin
+
+    def config(self) -> GraphConfig:
+        self._importar_legado()
+        with self._lock:
+            self._leer_cola()
+            return GraphConfig(nodos=list(self.nodos.values()), rutas=list(self.rutas))
+
+    def revision(self) -> Optional[Tuple[int, int]]:
+        # El log solo crece, y compactar cambia el inode: (inode, tamaño) identifica el contenido
+        self._importar_legado()
+        try:
+            st = self.ruta_log.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    # ------------------------------
+    # Escritura
+    # ------------------------------
+
+    @contextmanager
+    def _bloqueo(self):
+        """Lock exclusivo entre procesos (archivo aparte: el log se reemplaza al compactar)."""
+        CUSTOM_GRAPH_DIR.mkdir(parents=True, exist_ok=True)
+        with self._lock, self.ruta_lock.open("a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._leer_cola()
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _importar_legado(self) -> None:
+        """
+        Primer acceso de un usuario sin log: si tiene un log con el nombre
+        de la versión anterior, se renombra; si no, y existe el archivo
+        global, su contenido pasa a ser el log del usuario.
+        Un reset posterior deja el log vacío (no se vuelve a importar).
+        """
+        if self._legado_revisado:
+            return
+        if not self.ruta_log.exists():
+            anterior = CUSTOM_GRAPH_DIR / f"{self.nombre_anterior}.log" if self.nombre_anterior else None
+            if anterior is not None and anterior.exists():
+                with self._bloqueo():
+                    if not self.ruta_log.exists() and anterior.exists():
+                        os.replace(anterior, self.ruta_log)
+                        print(f"Config de grafo de {self.username}: migrado {anterior} a {self.ruta_log}")
+            elif LEGACY_CUSTOM_GRAPH_PATH.exists():
+                nodos, rutas = _leer_legado()
+                with self._bloqueo():
+                    if not self.ruta_log.exists():
+                        self._escribir_completo(nodos, rutas)
+                        print(
+                            f"Config de grafo de {self.username}: importados {len(nodos)} nodos y "
+                            f"{len(rutas)} rutas de {LEGACY_CUSTOM_GRAPH_PATH}"
+                        )
+        self._legado_revisado = True
+
+    def agregar(self, op: str, data: Optional[dict] = None) -> GraphConfig:
+        self._importar_legado()
+        cambio = {"op": op, "data": data} if data is not None else {"op": op}
+        linea = (json.dumps(cambio, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._bloqueo():
+            # O_APPEND + una sola escritura: la línea queda entera al final
+            fd = os.open(self.ruta_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, linea)
+            finally:
+                os.close(fd)
+            self._leer_cola()
+
+            vivas = len(self.nodos) + len(self.rutas)
+            if op == "reset" or (self.lineas > COMPACTAR_MIN_LINEAS and self.lineas > 2 * vivas):
+                self._escribir_completo(list(self.nodos.values()), self.rutas)
+                self._leer_cola()
+
+            return GraphConfig(nodos=list(self.nodos.values()), rutas=list(self.rutas))
+
+    def _escribir_completo(self, nodos: List[CustomNode], rutas: List[CustomRoute]) -> None:
+        """Reescribe el log con solo el estado vigente (tmp + rename atómico)."""
+        tmp = self.ruta_log.with_name(f".{self.ruta_log.name}.{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for n in nodos:
+                f.write(json.dumps({"op": "node", "data": n.dict()}, ensure_ascii=False) + "\n")
+            for r in rutas:
+                f.write(json.dumps({"op": "route", "data": r.dict()}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.ruta_log)
+
+
+def _leer_legado() -> Tuple[List[CustomNode], List[CustomRoute]]:
+    try:
+        with LEGACY_CUSTOM_GRAPH_PATH.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"⚠️ {LEGACY_CUSTOM_GRAPH_PATH} ilegible, no se importa ({e})")
+        return [], []
+
+    def validos(modelo, items):
+        # Cada elemento por separado: uno inválido (p. ej. peso negativo) no tira el resto
+        resultado = []
+        for item in items or []:
+            try:
+                resultado.append(modelo(**item))
+            except Exception as e:
+                print(f"⚠️ {LEGACY_CUSTOM_GRAPH_PATH}: elemento ignorado {item} ({e})")
+        return resultado
+
+    nodos = {n.id: n for n in validos(CustomNode, data.get("nodos"))}
+    return list(nodos.values()), validos(CustomRoute, data.get("rutas"))
+
+
+_vistas = CacheLRU(int(os.getenv("ECOROUTE_GRAPH_CONFIG_VISTAS", "1024")))
+
+
+def _vista(username: str) -> _VistaConfig:
+    return _vistas.obtener(username, lambda: _VistaConfig(username))
+
+
+def revision_config(username: str) -> Optional[Tuple[int, int]]:
+    """
+    Identifica la versión guardada sin leerla. None si el usuario nunca
+    guardó personalizaciones.
+    """
+    return _vista(username).revision()
+
+
+def cargar_config(username: str) -> GraphConfig:
+    return _vista(username).config()
+
+
+def agregar_nodo(username: str, nodo: CustomNode) -> GraphConfig:
+    """Alta o actualización de un nodo por id."""
+    return _vista(username).agregar("node", nodo.dict())
+
+
+def agregar_ruta(username: str, ruta: CustomRoute) -> GraphConfig:
+    return _vista(username).agregar("route", ruta.dict())
+
+
+def reiniciar_config(username: str) -> GraphConfig:
+    return _vista(username).agregar("reset")
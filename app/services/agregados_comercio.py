@@ -0,0 +1,147 @@
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app.core.cache import CacheLRU
+from app.models.trade_data import TradeData
+from app.services.vista_incremental import Marca, VistaIncremental
+
+# Agrupaciones de /api/trade-flows/aggregate -> dimensiones del cubo que conservan
+AGRUPACIONES = {
+    "route": ("origin", "destination"),
+    "product": ("product",),
+    "month": ("month",),
+}
+DIMENSIONES = ("origin", "destination", "product", "month")
+MEDIDAS = ("total_price", "quantity", "tariff")
+
+# Resúmenes ya calculados por (generación del cubo, agrupación, filtros)
+_cache_resumenes = CacheLRU(int(os.getenv("ECOROUTE_CACHE_AGREGADOS", "256")))
+
+# Celda del cubo: [filas, suma y no nulos de cada medida] -> 1 + 2 * len(MEDIDAS)
+Celda = List[float]
+ClaveCelda = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+def _mes():
+    # `date` es texto "YYYY-MM-DD..." : el mes son los 7 primeros caracteres
+    return func.substr(TradeData.date, 1, 7)
+
+
+def _consulta_cubo(hasta_id: int, desde_id: Optional[int] = None):
+    """GROUP BY en la BD al grano más fino que se sirve (origen, destino, producto, mes)."""
+    columnas = [func.count(TradeData.id)]
+    for medida in MEDIDAS:
+        columna = getattr(TradeData, medida)
+        # COUNT(columna) cuenta los no nulos: así el promedio coincide con AVG()
+        columnas += [func.sum(columna), func.count(columna)]
+
+    mes = _mes()
+    consulta = select(TradeData.origin, TradeData.destination, TradeData.product, mes, *columnas)
+    consulta = consulta.where(TradeData.id <= hasta_id)
+    if desde_id is not None:
+        consulta = consulta.where(TradeData.id > desde_id)
+    return consulta.group_by(TradeData.origin, TradeData.destination, TradeData.product, mes)
+
+
+@dataclass(frozen=True)
+class CuboComercio:
+    """Foto inmutable del cubo que leen las peticiones."""
+    celdas: Dict[ClaveCelda, Tuple[float, ...]]
+    marca: Marca
+    filas: int
+    generacion: int   # distingue reconstrucciones con la misma marca (UPDATEs)
+
+
+class VistaAgregados(VistaIncremental):
+    """
+    Cubo en memoria de trade_data por (origen, destino, producto, mes) con
+    conteo, sumas y no nulos de total_price, quantity y tariff.
+
+    Se arma con un GROUP BY en la BD; las altas se suman con otro GROUP BY
+    solo sobre las filas nuevas. Cualquier agrupación más gruesa (ruta,
+    producto, mes) sale de sumar celdas, sin volver a leer la tabla.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._celdas: Dict[ClaveCelda, Celda] = {}
+        self._generaciones = itertools.count(1)
+
+    def _sumar(self, filas) -> int:
+        total = 0
+        for origen, destino, producto, mes, *valores in filas:
+            celda = self._celdas.get((origen, destino, producto, mes))
+            if celda is None:
+                celda = self._celdas[(origen, destino, producto, mes)] = [0.0] * len(valores)
+            for i, valor in enumerate(valores):
+                celda[i] += valor or 0
+            total += valores[0]
+        return int(total)
+
+    def _reconstruir(self, db, hasta_id: int) -> None:
+        self._celdas = {}
+        self._sumar(db.execute(_consulta_cubo(hasta_id)))
+
+    def _agregar_nuevas(self, db, desde_id: int, hasta_id: int) -> int:
+        return self._sumar(db.execute(_consulta_cubo(hasta_id, desde_id)))
+
+    def _publicar(self, marca: Marca) -> CuboComercio:
+        cubo = CuboComercio(
+            celdas={clave: tuple(celda) for clave, celda in self._celdas.items()},
+            marca=marca,
+            filas=marca[0],
+            generacion=next(self._generaciones),
+        )
+        # Los resúmenes sin filtros son los que piden las vistas de mapa de calor
+        for agrupacion in AGRUPACIONES:
+            resumir(cubo, agrupacion, {})
+        return cubo
+
+
+vista_agregados = VistaAgregados()
+
+
+def _calcular(cubo: CuboComercio, agrupacion: str, filtros: Dict[str, str]) -> List[dict]:
+    posiciones = [DIMENSIONES.index(d) for d in AGRUPACIONES[agrupacion]]
+    condiciones = [(DIMENSIONES.index(d), v) for d, v in filtros.items()]
+
+    grupos: Dict[tuple, List[float]] = {}
+    for clave, valores in cubo.celdas.items():
+        if any(clave[i] != v for i, v in condiciones):
+            continue
+        grupo = tuple(clave[i] for i in posiciones)
+        acumulado = grupos.get(grupo)
+        if acumulado is None:
+            grupos[grupo] = list(valores)
+        else:
+            for i, valor in enumerate(valores):
+                acumulado[i] += valor
+
+    resultado = []
+    for grupo, valores in grupos.items():
+        fila = dict(zip(AGRUPACIONES[agrupacion], grupo))
+        fila["count"] = int(valores[0])
+        for j, medida in enumerate(MEDIDAS):
+            suma, no_nulos = valores[1 + 2 * j], valores[2 + 2 * j]
+            fila[f"{medida}_sum"] = suma
+            fila[f"{medida}_avg"] = suma / no_nulos if no_nulos else None
+        resultado.append(fila)
+
+    resultado.sort(key=lambda f: f["total_price_sum"], reverse=True)
+    return resultado
+
+
+def resumir(cubo: CuboComercio, agrupacion: str, filtros: Dict[str, str]) -> List[dict]:
+    """
+    Grupos de `agrupacion` ('route', 'product' o 'month') con count, suma y
+    promedio de cada medida, ordenados por total_price_sum descendente.
+    `filtros` restringe por igualdad en cualquiera de las DIMENSIONES.
+    """
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f"Agrupación no válida (use {', '.join(AGRUPACIONES)}).")
+    clave = (cubo.generacion, agrupacion, tuple(sorted(filtros.items())))
+    return _cache_resumenes.obtener(clave, lambda: _calcular(cubo, agrupacion, filtros))
@@ -0,0 +1,244 @@
+import heapq
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.models.grafo import GrafoRutas
+from app.models.ruta import Ruta
+from .dijkstra import reconstruir_camino
+from .pesos import PerfilPeso
+
+INF = float("inf")
+RADIO_TIERRA_KM = 6371.0
+
+
+# ------------------------------
+# Cota inferior geográfica
+# ------------------------------
+
+def _coordenadas(grafo: GrafoRutas) -> Tuple[List[float], List[float]]:
+    """(lat, lon) en radianes por índice interno. Nodos sin coordenadas -> (0, 0)."""
+    def construir():
+        lat, lon = [], []
+        for nodo_id in grafo.ids:
+            nodo = grafo.nodos.get(nodo_id)
+            lat.append(math.radians(nodo.lat or 0.0) if nodo else 0.0)
+            lon.append(math.radians(nodo.lon or 0.0) if nodo else 0.0)
+        return lat, lon
+    return grafo.derivado("coords_rad", construir)
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _ratios_por_modo(grafo: GrafoRutas, criterio: str) -> List[float]:
+    """
+    Para cada tipo de transporte, el menor valor de (peso base / km de
+    círculo máximo) entre sus aristas: la inversa de la velocidad máxima
+    para "rapidez" y el costo mínimo por km para "economia".
+    """
+    def construir():
+        lat, lon = _coordenadas(grafo)
+        base = grafo.tiempo_horas if criterio == "rapidez" else grafo.costo_base_usd_ton
+        ratios = [INF] * len(grafo.tipos)
+        for e, v in enumerate(grafo.destinos):
+            u = grafo.origenes[e]
+            km = _haversine(lat[u], lon[u], lat[v], lon[v])
+            if km <= 0:
+                continue
+            bit = grafo.modos[e].bit_length() - 1
+            ratios[bit] = min(ratios[bit], max(base[e], 0.0) / km)
+        return ratios
+    return grafo.derivado(("ratios_gc", criterio), construir)
+
+
+def factor_cota(grafo: GrafoRutas, perfil: PerfilPeso) -> float:
+    """
+    Peso mínimo por km de círculo máximo entre las aristas permitidas.
+    Para toda arista permitida peso >= factor * haversine(u, v), así que
+    factor * haversine(v, t) nunca sobreestima lo que falta hasta t
+    (cota admisible y consistente).
+    """
+    ratios = _ratios_por_modo(grafo, perfil.criterio)
+    permitidos = [r for bit, r in enumerate(ratios) if perfil.mascara & (1 << bit)]
+    factor = min(permitidos, default=INF)
+    if factor == INF:
+        return 0.0
+    if perfil.criterio == "economia":
+        factor *= perfil.factor
+    # Margen por redondeo en coma flotante
+    return factor * (1 - 1e-9)
+
+
+def _cota_hacia(grafo: GrafoRutas, perfil: PerfilPeso, t: int) -> Callable[[int], float]:
+    lat, lon = _coordenadas(grafo)
+    factor = factor_cota(grafo, perfil)
+    lat_t, lon_t = lat[t], lon[t]
+    memo: Dict[int, float] = {}
+
+    def h(v: int) -> float:
+        valor = memo.get(v)
+        if valor is None:
+            valor = factor * _haversine(lat[v], lon[v], lat_t, lon_t)
+            memo[v] = valor
+        return valor
+
+    return h
+
+
+# ------------------------------
+# Búsquedas
+# ------------------------------
+
+def astar(
+    grafo: GrafoRutas,
+    origen: str,
+    destino: str,
+    pesos: Sequence[float],
+    perfil: PerfilPeso,
+) -> Optional[Tuple[List[Ruta], float]]:
+    s = grafo.indice[origen]
+    t = grafo.indice[destino]
+    aristas_de = grafo.aristas_de
+    destinos = grafo.destinos
+    h = _cota_hacia(grafo, perfil, t)
+
+    dist: Dict[int, float] = {s: 0.0}
+    previo: Dict[int, int] = {}
+    cerrado = set()
+    pq: List[Tuple[float, int]] = [(h(s), s)]
+
+    while pq:
+        _, u = heapq.heappop(pq)
+        if u in cerrado:
+            continue
+        cerrado.add(u)
+
+        if u == t:
+            break
+
+        g = dist[u]
+        for e in aristas_de(u):
+            w = pesos[e]
+            if w == INF:
+                continue
+
+            v = destinos[e]
+            nuevo = g + w
+            if nuevo < dist.get(v, INF):
+                dist[v] = nuevo
+                previo[v] = e
+                heapq.heappush(pq, (nuevo + h(v), v))
+
+    if t not in dist:
+        return None
+
+    rutas = reconstruir_camino(grafo, previo, s, t)
+    if rutas is None:
+        return None
+    return rutas, dist[t]
+
+
+def dijkstra_bidireccional(
+    grafo: GrafoRutas,
+    origen: str,
+    destino: str,
+    pesos: Sequence[float],
+    perfil: PerfilPeso,
+) -> Optional[Tuple[List[Ruta], float]]:
+    """
+    Búsqueda bidireccional guiada por la misma cota geográfica.
+
+    Usa el potencial promedio p(v) = (h_t(v) - h_s(v)) / 2 hacia adelante y
+    -p(v) hacia atrás, que deja costos reducidos no negativos en ambos
+    sentidos. Con esas claves la búsqueda puede parar en cuanto
+    tope_adelante + tope_atras >= mejor camino encontrado.
+    """
+    s = grafo.indice[origen]
+    t = grafo.indice[destino]
+    aristas_de = grafo.aristas_de
+    destinos = grafo.destinos
+    origenes = grafo.origenes
+
+    h_t = _cota_hacia(grafo, perfil, t)
+    h_s = _cota_hacia(grafo, perfil, s)
+
+    def p(v: int) -> float:
+        return (h_t(v) - h_s(v)) / 2
+
+    dist_f: Dict[int, float] = {s: 0.0}
+    dist_b: Dict[int, float] = {t: 0.0}
+    previo: Dict[int, int] = {}        # nodo -> arista de llegada (desde s)
+    siguiente: Dict[int, int] = {}     # nodo -> arista de salida (hacia t)
+    cerrado_f = set()
+    cerrado_b = set()
+    pq_f: List[Tuple[float, int]] = [(p(s), s)]
+    pq_b: List[Tuple[float, int]] = [(-p(t), t)]
+
+    mejor = INF
+    encuentro: Optional[int] = s if s == t else None
+
+    while pq_f and pq_b:
+        if pq_f[0][0] + pq_b[0][0] >= mejor:
+            break
+
+        if pq_f[0][0] <= pq_b[0][0]:
+            _, u = heapq.heappop(pq_f)
+            if u in cerrado_f:
+                continue
+            cerrado_f.add(u)
+            g = dist_f[u]
+            for e in aristas_de(u):
+                w = pesos[e]
+                if w == INF:
+                    continue
+                v = destinos[e]
+                nuevo = g + w
+                if nuevo < dist_f.get(v, INF):
+                    dist_f[v] = nuevo
+                    previo[v] = e
+                    heapq.heappush(pq_f, (nuevo + p(v), v))
+                    total = nuevo + dist_b.get(v, INF)
+                    if total < mejor:
+                        mejor, encuentro = total, v
+        else:
+            _, v = heapq.heappop(pq_b)
+            if v in cerrado_b:
+                continue
+            cerrado_b.add(v)
+            g = dist_b[v]
+            for e in grafo.aristas_entrantes(v):
+                w = pesos[e]
+                if w == INF:
+                    continue
+                u = origenes[e]
+                nuevo = g + w
+                if nuevo < dist_b.get(u, INF):
+                    dist_b[u] = nuevo
+                    siguiente[u] = e
+                    heapq.heappush(pq_b, (nuevo - p(u), u))
+                    total = nuevo + dist_f.get(u, INF)
+                    if total < mejor:
+                        mejor, encuentro = total, u
+
+    if encuentro is None:
+        return None
+
+    ida = reconstruir_camino(grafo, previo, s, encuentro)
+    if ida is None:
+        return None
+
+    vuelta: List[Ruta] = []
+    actual = encuentro
+    while actual != t:
+        e = siguiente.get(actual)
+        if e is None:
+            return None
+        vuelta.append(grafo.ruta(e))
+        actual = destinos[e]
+
+    return ida + vuelta, mejor
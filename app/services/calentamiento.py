@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services.agregados_comercio import vista_agregados
+from app.services.coordenadas import resolutor
+from app.services.grafo_store import obtener_snapshot, recargar_grafo_async
+from app.services.opciones_comercio import vista_opciones
+from app.services.rutas_service import RutasService
+
+CRITERIOS = ("rapidez", "economia")
+
+# Floyd-Warshall es O(n^3) en tiempo y O(n^2) en memoria: en redes grandes
+# no se precalcula al arrancar (se sigue calculando en la primera petición)
+FW_MAX_NODOS = int(os.getenv("ECOROUTE_CALENTAR_FW_MAX_NODOS", "2000"))
+# Tope de tablas distintas: cada producto puede dar un perfil distinto
+MAX_TABLAS = int(os.getenv("ECOROUTE_CALENTAR_MAX_TABLAS", "16"))
+
+
+class EstadoCalentamiento:
+    """Progreso del calentamiento del arranque (lo consulta /ready)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.listo = False
+        self.etapa = "pendiente"
+        self.errores: List[str] = []
+        self.tablas = 0
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+
+    def avanzar(self, etapa: str) -> None:
+        with self._lock:
+            self.etapa = etapa
+            if self.inicio is None:
+                self.inicio = time.time()
+
+    def fallo(self, etapa: str, error: Exception) -> None:
+        print(f"⚠️ Calentamiento: falló '{etapa}' ({error})")
+        traceback.print_exc()
+        with self._lock:
+            self.errores.append(f"{etapa}: {error}")
+
+    def terminar(self) -> None:
+        with self._lock:
+            self.listo = True
+            self.etapa = "listo"
+            self.fin = time.time()
+
+    def resumen(self) -> Dict[str, object]:
+        with self._lock:
+            duracion = (self.fin or time.time()) - self.inicio if self.inicio else None
+            return {
+                "status": "ready" if self.listo else "warming_up",
+                "etapa": self.etapa,
+                "tablas_floyd": self.tablas,
+                "errores": list(self.errores),
+                "duracion_s": round(duracion, 3) if duracion is not None else None,
+            }
+
+
+estado = EstadoCalentamiento()
+
+
+def _perfiles_comunes(servicio: RutasService):
+    """(criterio, producto_id): primero sin producto y luego cada producto del catálogo."""
+    for criterio in CRITERIOS:
+        yield criterio, None
+    for producto_id in servicio.grafo.productos:
+        for criterio in CRITERIOS:
+            yield criterio, producto_id
+
+
+def precalcular_tablas() -> None:
+    """Pesos y tablas de Floyd-Warshall de los perfiles comunes del grafo actual."""
+    servicio = RutasService(obtener_snapshot().grafo)
+    floyd = servicio.grafo.num_nodos() <= FW_MAX_NODOS
+    if not floyd:
+        print(f"Calentamiento: {servicio.grafo.num_nodos()} nodos, se omite Floyd-Warshall")
+
+    vistos = set()
+    for criterio, producto_id in _perfiles_comunes(servicio):
+        if len(vistos) >= MAX_TABLAS:
+            break
+        perfil = servicio.precalcular(criterio, producto_id, floyd=False)
+        # Productos con el mismo perfil comparten tablas
+        if perfil.clave in vistos:
+            continue
+        vistos.add(perfil.clave)
+        if floyd:
+            servicio.precalcular(criterio, producto_id)
+            estado.tablas += 1
+
+
+def precalcular_coordenadas() -> None:
+    """Índice de `paises` y resolución de cada país que aparece en trade_data."""
+    resolutor.reconstruir()
+    resolutor.resolver_lote(vista_opciones.paises())
+
+
+async def calentar() -> None:
+    """
+    Fase de calentamiento del lifespan: carga el grafo, precalcula las
+    tablas de los perfiles comunes, materializa las trade-options y
+    el cubo de agregados, y resuelve las coordenadas de sus países.
+    Un paso que falla no impide los siguientes; el proceso queda listo
+    igual y ese trabajo se hará en la primera petición que lo necesite.
+    """
+    estado.avanzar("grafo")
+    try:
+        snap = await recargar_grafo_async()
+        print(f"Grafo cargado (version {snap.version}, {len(snap.grafo.nodos)} nodos)")
+    except Exception as e:
+        # Si la BD no responde al arrancar, se cargará en la primera petición
+        estado.fallo("grafo", e)
+    else:
+        estado.avanzar("tablas")
+        try:
+            # CPU pesado: fuera del event loop
+            await run_in_threadpool(precalcular_tablas)
+        except Exception as e:
+            estado.fallo("tablas", e)
+
+    estado.avanzar("opciones_comercio")
+    try:
+        await run_in_threadpool(vista_opciones.refrescar)
+    except Exception as e:
+        estado.fallo("opciones_comercio", e)
+
+    estado.avanzar("agregados_comercio")
+    try:
+        await run_in_threadpool(vista_agregados.refrescar)
+    except Exception as e:
+        estado.fallo("agregados_comercio", e)
+
+    estado.avanzar("coordenadas")
+    try:
+        await run_in_threadpool(precalcular_coordenadas)
+    except Exception as e:
+        estado.fallo("coordenadas", e)
+
+    estado.terminar()
+    print(f"Calentamiento terminado en {estado.resumen()['duracion_s']} s")
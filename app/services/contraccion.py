@@ -0,0 +1,333 @@
+import heapq
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.cache import DISCO_GRACIA_S
+from app.models.grafo import GrafoRutas
+from .pesos import PerfilPeso, pesos_aristas
+
+INF = float("inf")
+
+CH_DIR = Path(os.getenv("ECOROUTE_CH_DIR", os.path.join(tempfile.gettempdir(), "ecoroute_ch")))
+
+# Último os.utime de cada .npz en uso por este worker
+_marcadas: Dict[Path, float] = {}
+
+# Nodos asentados como máximo en cada búsqueda de testigo. Si se corta antes,
+# se agrega un atajo que quizá no hacía falta (nunca uno incorrecto).
+LIMITE_TESTIGO = 300
+
+_CAMPOS = ("rango", "arco_u", "arco_v", "arco_w", "arco_e", "arco_a", "arco_b")
+
+
+class JerarquiaContraccion:
+    """
+    Contraction hierarchy de un grafo para un perfil de pesos.
+
+    Los arcos son las aristas originales (arco_e = índice de la arista) más
+    los atajos (arco_e = -1), que apuntan a los dos arcos que reemplazan
+    (arco_a, arco_b). Las consultas son un Dijkstra bidireccional que solo
+    sube de rango; el camino se desempaqueta a aristas originales del grafo.
+    """
+
+    def __init__(self, rango, arco_u, arco_v, arco_w, arco_e, arco_a, arco_b):
+        self.rango = list(rango)
+        self.arco_u = list(arco_u)
+        self.arco_v = list(arco_v)
+        self.arco_w = list(arco_w)
+        self.arco_e = list(arco_e)
+        self.arco_a = list(arco_a)
+        self.arco_b = list(arco_b)
+
+        n = len(self.rango)
+        self.subida: List[List[int]] = [[] for _ in range(n)]   # u -> arcos (u, v) con rango[v] > rango[u]
+        self.bajada: List[List[int]] = [[] for _ in range(n)]   # v -> arcos (u, v) con rango[u] > rango[v]
+        for a, (u, v) in enumerate(zip(self.arco_u, self.arco_v)):
+            if self.rango[v] > self.rango[u]:
+                self.subida[u].append(a)
+            else:
+                self.bajada[v].append(a)
+
+    # ------------------------------
+    # Preprocesamiento
+    # ------------------------------
+
+    @classmethod
+    def construir(cls, grafo: GrafoRutas, pesos: Sequence[float]) -> "JerarquiaContraccion":
+        n = grafo.num_nodos()
+        arco_u: List[int] = []
+        arco_v: List[int] = []
+        arco_w: List[float] = []
+        arco_e: List[int] = []
+        arco_a: List[int] = []
+        arco_b: List[int] = []
+        arco_id: Dict[Tuple[int, int], int] = {}
+
+        # Grafo restante (solo nodos aún no contraídos)
+        salida: List[Dict[int, float]] = [{} for _ in range(n)]
+        entrada: List[Dict[int, float]] = [{} for _ in range(n)]
+
+        def poner_arco(u: int, v: int, w: float, e: int, a: int, b: int) -> None:
+            idx = arco_id.get((u, v))
+            if idx is None:
+                arco_id[(u, v)] = len(arco_u)
+                arco_u.append(u)
+                arco_v.append(v)
+                arco_w.append(w)
+                arco_e.append(e)
+                arco_a.append(a)
+                arco_b.append(b)
+            else:
+                # Un arco entre dos nodos sin contraer no es hijo de ningún atajo todavía
+                arco_w[idx], arco_e[idx], arco_a[idx], arco_b[idx] = w, e, a, b
+            salida[u][v] = w
+            entrada[v][u] = w
+
+        for e in range(grafo.num_aristas()):
+            w = pesos[e]
+            u, v = grafo.origenes[e], grafo.destinos[e]
+            if w == INF or u == v:
+                continue
+            if w < salida[u].get(v, INF):
+                poner_arco(u, v, w, e, -1, -1)
+
+        def testigos(u: int, excluido: int, limite: float, objetivos: set) -> Dict[int, float]:
+            dist = {u: 0.0}
+            asentados = 0
+            pendientes = set(objetivos)
+            pq = [(0.0, u)]
+            while pq and pendientes and asentados < LIMITE_TESTIGO:
+                d, x = heapq.heappop(pq)
+                if d > dist[x]:
+                    continue
+                if d > limite:
+                    break
+                asentados += 1
+                pendientes.discard(x)
+                for y, w in salida[x].items():
+                    if y == excluido:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(y, INF):
+                        dist[y] = nd
+                        heapq.heappush(pq, (nd, y))
+            return dist
+
+        def atajos(v: int) -> List[Tuple[int, int, float]]:
+            resultado = []
+            for u, w_uv in entrada[v].items():
+                salidas = [(x, w_vx) for x, w_vx in salida[v].items() if x != u]
+                if not salidas:
+                    continue
+                limite = w_uv + max(w for _, w in salidas)
+                dist = testigos(u, v, limite, {x for x, _ in salidas})
+                for x, w_vx in salidas:
+                    if dist.get(x, INF) > w_uv + w_vx:
+                        resultado.append((u, x, w_uv + w_vx))
+            return resultado
+
+        vecinos_contraidos = [0] * n
+
+        def prioridad(v: int) -> int:
+            # Diferencia de aristas + vecinos ya contraídos (reparte la contracción)
+            return len(atajos(v)) - len(entrada[v]) - len(salida[v]) + vecinos_contraidos[v]
+
+        pq = [(prioridad(v), v) for v in range(n)]
+        heapq.heapify(pq)
+        rango = [0] * n
+        orden = 0
+
+        while pq:
+            _, v = heapq.heappop(pq)
+            nueva = prioridad(v)
+            if pq and nueva > pq[0][0]:
+                heapq.heappush(pq, (nueva, v))
+                continue
+
+            for u, x, w in atajos(v):
+                if w < salida[u].get(x, INF):
+                    poner_arco(u, x, w, -1, arco_id[(u, v)], arco_id[(v, x)])
+
+            for u in entrada[v]:
+                del salida[u][v]
+                vecinos_contraidos[u] += 1
+            for x in salida[v]:
+                del entrada[x][v]
+                vecinos_contraidos[x] += 1
+            entrada[v] = {}
+            salida[v] = {}
+
+            rango[v] = orden
+            orden += 1
+
+        return cls(rango, arco_u, arco_v, arco_w, arco_e, arco_a, arco_b)
+
+    # ------------------------------
+    # Consultas
+    # ------------------------------
+
+    def consulta(self, s: int, t: int) -> Optional[Tuple[List[int], float]]:
+        """Devuelve (aristas originales del camino, costo) o None."""
+        if s == t:
+            return [], 0.0
+
+        dist_f: Dict[int, float] = {s: 0.0}
+        dist_b: Dict[int, float] = {t: 0.0}
+        previo_f: Dict[int, int] = {}
+        previo_b: Dict[int, int] = {}
+        pq_f = [(0.0, s)]
+        pq_b = [(0.0, t)]
+        mejor = INF
+        encuentro = -1
+
+        while (pq_f and pq_f[0][0] < mejor) or (pq_b and pq_b[0][0] < mejor):
+            adelante = pq_f and pq_f[0][0] < mejor and (
+                not pq_b or pq_b[0][0] >= mejor or pq_f[0][0] <= pq_b[0][0]
+            )
+            if adelante:
+                d, u = heapq.heappop(pq_f)
+                if d > dist_f[u]:
+                    continue
+                total = d + dist_b.get(u, INF)
+                if total < mejor:
+                    mejor, encuentro = total, u
+                for a in self.subida[u]:
+                    v = self.arco_v[a]
+                    nd = d + self.arco_w[a]
+                    if nd < dist_f.get(v, INF):
+                        dist_f[v] = nd
+                        previo_f[v] = a
+                        heapq.heappush(pq_f, (nd, v))
+            else:
+                d, v = heapq.heappop(pq_b)
+                if d > dist_b[v]:
+                    continue
+                total = d + dist_f.get(v, INF)
+                if total < mejor:
+                    mejor, encuentro = total, v
+                for a in self.bajada[v]:
+                    u = self.arco_u[a]
+                    nd = d + self.arco_w[a]
+                    if nd < dist_b.get(u, INF):
+                        dist_b[u] = nd
+                        previo_b[u] = a
+                        heapq.heappush(pq_b, (nd, u))
+
+        if encuentro < 0:
+            return None
+
+        arcos: List[int] = []
+        x = encuentro
+        while x != s:
+            a = previo_f[x]
+            arcos.append(a)
+            x = self.arco_u[a]
+        arcos.reverse()
+        x = encuentro
+        while x != t:
+            a = previo_b[x]
+            arcos.append(a)
+            x = self.arco_v[a]
+
+        return self._desempaquetar(arcos), mejor
+
+    def _desempaquetar(self, arcos: List[int]) -> List[int]:
+        aristas: List[int] = []
+        pila = list(reversed(arcos))
+        while pila:
+            a = pila.pop()
+            if self.arco_e[a] >= 0:
+                aristas.append(self.arco_e[a])
+            else:
+                pila.append(self.arco_b[a])
+                pila.append(self.arco_a[a])
+        return aristas
+
+    # ------------------------------
+    # Persistencia
+    # ------------------------------
+
+    def guardar(self, ruta: Path) -> None:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.parent / f".tmp-{os.getpid()}-{uuid.uuid4().hex}.npz"
+        try:
+            np.savez(
+                tmp,
+                rango=np.asarray(self.rango, dtype=np.int32),
+                arco_u=np.asarray(self.arco_u, dtype=np.int32),
+                arco_v=np.asarray(self.arco_v, dtype=np.int32),
+                arco_w=np.asarray(self.arco_w, dtype=np.float64),
+                arco_e=np.asarray(self.arco_e, dtype=np.int32),
+                arco_a=np.asarray(self.arco_a, dtype=np.int32),
+                arco_b=np.asarray(self.arco_b, dtype=np.int32),
+            )
+            os.replace(tmp, ruta)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    @classmethod
+    def cargar(cls, ruta: Path) -> "JerarquiaContraccion":
+        with np.load(ruta) as datos:
+            return cls(*(datos[campo].tolist() for campo in _CAMPOS))
+
+
+def perfil_base(perfil: PerfilPeso) -> PerfilPeso:
+    """
+    El peso del producto solo escala el costo de todas las aristas por igual,
+    así que no cambia los caminos: basta una jerarquía por criterio y máscara.
+    """
+    clase = "tiempo" if perfil.criterio == "rapidez" else "base"
+    return PerfilPeso(perfil.criterio, perfil.mascara, clase, 1.0)
+
+
+def obtener_jerarquia(grafo: GrafoRutas, perfil: PerfilPeso) -> JerarquiaContraccion:
+    """
+    Jerarquía del grafo para el perfil: primero en memoria, luego en disco
+    (la comparten todos los workers) y, si no existe, se construye y guarda.
+    """
+    base = perfil_base(perfil)
+    ruta = CH_DIR / f"{grafo.version}__{base.criterio}__m{base.mascara}.npz"
+
+    def cargar_o_construir() -> JerarquiaContraccion:
+        if ruta.exists():
+            try:
+                return JerarquiaContraccion.cargar(ruta)
+            except (OSError, ValueError, KeyError):
+                pass
+
+        jerarquia = JerarquiaContraccion.construir(grafo, pesos_aristas(grafo, base))
+        jerarquia.guardar(ruta)
+
+        # Jerarquías de otras versiones del grafo: otro worker puede seguir en
+        # esa versión, así que solo se borran las que nadie usó (mtime) en
+        # DISCO_GRACIA_S. Solo se miran las publicadas (<version>__...): los
+        # .tmp-* son de otros workers que todavía están escribiendo.
+        limite = time.time() - DISCO_GRACIA_S
+        for viejo in CH_DIR.glob("*__*.npz"):
+            if viejo.name.startswith(".") or viejo.name.split("__", 1)[0] == grafo.version:
+                continue
+            try:
+                if viejo.stat().st_mtime < limite:
+                    viejo.unlink(missing_ok=True)
+            except OSError:
+                continue
+        return jerarquia
+
+    jerarquia = grafo.derivado(("ch",) + base.clave, cargar_o_construir)
+    # La jerarquía se usa desde memoria: se renueva el mtime de vez en cuando
+    # para que los demás workers no la den por abandonada
+    ahora = time.time()
+    if ahora - _marcadas.get(ruta, 0.0) >= DISCO_GRACIA_S / 4:
+        _marcadas[ruta] = ahora
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+    return jerarquia
@@ -0,0 +1,136 @@
+import threading
+import unicodedata
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.pais_model import PaisModel
+
+# Alias escritos a mano (respaldo cuando el nombre no coincide con `paises`)
+COUNTRY_COORDS = {
+    "alemania": (51.1657, 10.4515),
+    "germany": (51.1657, 10.4515),
+    "china": (35.8617, 104.1954),
+    "brasil": (-14.2350, -51.9253),
+    "brazil": (-14.2350, -51.9253),
+    "japon": (36.2048, 138.2529),
+    "japan": (36.2048, 138.2529),
+    "espana": (40.4637, -3.7492),
+    "spain": (40.4637, -3.7492),
+    "francia": (46.6034, 1.8883),
+    "france": (46.6034, 1.8883),
+    "corea del sur": (35.9078, 127.7669),
+    "south korea": (35.9078, 127.7669),
+    "mexico": (23.6345, -102.5528),
+    "eeuu": (37.0902, -95.7129),
+    "estados unidos": (37.0902, -95.7129),
+    "usa": (37.0902, -95.7129),
+    "united states": (37.0902, -95.7129),
+    "india": (20.5937, 78.9629),
+    "sudafrica": (-30.5595, 22.9375),
+    "south africa": (-30.5595, 22.9375),
+    "peru": (-9.19, -75.0152),
+    "chile": (-35.6751, -71.5430),
+    "egipto": (26.8206, 30.8025),
+    "egypt": (26.8206, 30.8025),
+    "colombia": (4.5709, -74.2973),
+    "vietnam": (14.0583, 108.2772),
+    "argentina": (-38.4161, -63.6167),
+    "republica argentina": (-38.4161, -63.6167),
+    "rep argentina": (-38.4161, -63.6167),
+}
+
+
+def normalize_country(name: str) -> str:
+    if not name: return ""
+    s = str(name).strip().replace(".", "")
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    return s.lower()
+
+
+class Coordenadas(NamedTuple):
+    pais_id: Optional[str]   # None si solo se conoce por alias
+    lat: Optional[float]
+    lon: Optional[float]
+
+
+SIN_COORDENADAS = Coordenadas(None, None, None)
+
+
+class ResolutorCoordenadas:
+    """
+    Traduce nombres de país de trade_data ("Perú", "EE.UU.", "PER"...) a
+    un país de la tabla `paises` con sus coordenadas.
+
+    El índice por nombre normalizado se arma una vez (id y nombre de cada
+    país, más COUNTRY_COORDS como respaldo) y cada texto ya visto se
+    memoriza tal cual, así que resolverlo otra vez es un acceso a dict sin
+    normalizar de nuevo.
+    """
+
+    def __init__(self, alias: Dict[str, Tuple[float, float]]):
+        self.alias = alias
+        self._indice: Optional[Dict[str, Coordenadas]] = None
+        self._memo: Dict[str, Coordenadas] = {}
+        self._lock = threading.Lock()
+
+    def reconstruir(self, db=None) -> None:
+        """Relee `paises` y descarta lo memorizado (p. ej. al recargar el grafo)."""
+        if db is None:
+            with SessionLocal() as session:
+                return self.reconstruir(session)
+
+        indice = self._indice_alias()
+        paises = db.execute(select(PaisModel.id, PaisModel.nombre, PaisModel.lat, PaisModel.lon)).all()
+        for pais_id, nombre, lat, lon in paises:
+            if lat is None or lon is None:
+                continue
+            coords = Coordenadas(pais_id, lat, lon)
+            # La tabla manda sobre los alias; el id también vale como nombre
+            for texto in (nombre, pais_id):
+                clave = normalize_country(texto)
+                if clave:
+                    indice[clave] = coords
+
+        with self._lock:
+            self._indice = indice
+            self._memo = {}
+
+    def _indice_alias(self) -> Dict[str, Coordenadas]:
+        return {clave: Coordenadas(None, lat, lon) for clave, (lat, lon) in self.alias.items()}
+
+    def _resolver_nuevo(self, nombre: str) -> Coordenadas:
+        if self._indice is None:
+            # Normalmente ya lo armó el calentamiento del arranque
+            try:
+                self.reconstruir()
+            except Exception as e:
+                # Sin BD quedan los alias; el próximo reconstruir() completa el índice
+                print(f"⚠️ No se pudo leer paises para las coordenadas: {e}")
+                with self._lock:
+                    self._indice = self._indice_alias()
+        coords = self._indice.get(normalize_country(nombre), SIN_COORDENADAS)
+        self._memo[nombre] = coords
+        return coords
+
+    def resolver(self, nombre: Optional[str]) -> Coordenadas:
+        if not nombre:
+            return SIN_COORDENADAS
+        coords = self._memo.get(nombre)
+        return coords if coords is not None else self._resolver_nuevo(nombre)
+
+    def resolver_lote(self, nombres: Iterable[Optional[str]]) -> Dict[str, Coordenadas]:
+        """
+        Resuelve todos los nombres distintos de un lote de filas de una vez;
+        las filas luego leen del dict devuelto.
+        """
+        memo = self._memo
+        return {
+            nombre: memo.get(nombre) or self._resolver_nuevo(nombre)
+            for nombre in set(nombres) if nombre
+        }
+
+
+resolutor = ResolutorCoordenadas(COUNTRY_COORDS)
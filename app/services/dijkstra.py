@@ -1,60 +1,139 @@
 import heapq
-from typing import Dict, List, Tuple, Optional, Callable
+from typing import Dict, List, Tuple, Optional, Sequence, Set
+from app.core.metrics import etapa
 from app.models.grafo import GrafoRutas
 from app.models.ruta import Ruta
 
+INF = float("inf")
+
 
 def dijkstra(
     grafo: GrafoRutas,
     origen: str,
     destino: str,
-    weight_func: Callable[[Ruta], float],
+    pesos: Sequence[float],
 ) -> Optional[Tuple[List[Ruta], float]]:
+    """
+    `pesos[e]` es el peso de la arista `e` del grafo (ver services/pesos.py);
+    las aristas prohibidas valen +inf.
+    """
+
+    # Trabajamos con índices internos del grafo (CSR), no con códigos de país
+    s = grafo.indice[origen]
+    t = grafo.indice[destino]
+    aristas_de = grafo.aristas_de
+    destinos = grafo.destinos
 
-    dist: Dict[str, float] = {n: float("inf") for n in grafo.obtener_nodos()}
-    previo: Dict[str, Tuple[str, Ruta]] = {}
-    visitado: Dict[str, bool] = {n: False for n in grafo.obtener_nodos()}
+    # Solo se guardan los nodos que la búsqueda llega a tocar
+    dist: Dict[int, float] = {s: 0.0}
+    previo: Dict[int, int] = {}           # arista usada para llegar a cada nodo
+    visitado = set()
 
-    dist[origen] = 0.0
-    pq: List[Tuple[float, str]] = [(0.0, origen)]
+    pq: List[Tuple[float, int]] = [(0.0, s)]
 
     while pq:
-        dist_actual, nodo_actual = heapq.heappop(pq)
+        dist_actual, u = heapq.heappop(pq)
 
         # Si ya fue visitado, saltar
-        if visitado[nodo_actual]:
+        if u in visitado:
             continue
 
-        visitado[nodo_actual] = True
+        visitado.add(u)
 
-        if nodo_actual == destino:
+        if u == t:
             break
 
-        for ruta in grafo.vecinos(nodo_actual):
-            w = weight_func(ruta)
-            if w == float("inf"):
+        for e in aristas_de(u):
+            w = pesos[e]
+            if w == INF:
                 continue
 
+            v = destinos[e]
             nuevo = dist_actual + w
 
-            if nuevo < dist[ruta.destino]:
-                dist[ruta.destino] = nuevo
-                previo[ruta.destino] = (nodo_actual, ruta)
-                heapq.heappush(pq, (nuevo, ruta.destino))
+            if nuevo < dist.get(v, INF):
+                dist[v] = nuevo
+                previo[v] = e
+                heapq.heappush(pq, (nuevo, v))
+
+    if t not in dist:
+        return None
 
-    if dist[destino] == float("inf"):
+    rutas_resultado = reconstruir_camino(grafo, previo, s, t)
+    if rutas_resultado is None:
         return None
+    return rutas_resultado, dist[t]
+
 
-    # Reconstrucción del camino
+@etapa("reconstruccion")
+def reconstruir_camino(
+    grafo: GrafoRutas,
+    previo: Dict[int, int],
+    s: int,
+    t: int,
+) -> Optional[List[Ruta]]:
+    """Recorre `previo` (nodo -> arista de llegada) desde t hasta s."""
     rutas_resultado: List[Ruta] = []
-    actual = destino
+    actual = t
 
-    while actual != origen:
-        if actual not in previo:
+    while actual != s:
+        e = previo.get(actual)
+        if e is None:
             return None  # no hay conexión real
-        anterior, ruta_usada = previo[actual]
-        rutas_resultado.append(ruta_usada)
-        actual = anterior
+        rutas_resultado.append(grafo.ruta(e))
+        actual = grafo.origenes[e]
 
     rutas_resultado.reverse()
-    return rutas_resultado, dist[destino]
+    return rutas_resultado
+
+
+def arbol_caminos_minimos(
+    grafo: GrafoRutas,
+    s: int,
+    pesos: Sequence[float],
+    objetivos: Optional[Set[int]] = None,
+) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """
+    Árbol de caminos mínimos desde el nodo interno `s`.
+
+    Devuelve (dist, previo) sobre índices internos; `dist` solo tiene los
+    nodos asentados, en el orden en que se asentaron (un padre siempre
+    aparece antes que sus hijos). Si se pasan `objetivos`,
+    la búsqueda se detiene en cuanto todos están asentados; si no, recorre
+    todo lo alcanzable.
+    """
+    aristas_de = grafo.aristas_de
+    destinos = grafo.destinos
+
+    dist: Dict[int, float] = {s: 0.0}
+    previo: Dict[int, int] = {}
+    asentados: Dict[int, float] = {}     # en orden de asentamiento
+    pendientes = set(objetivos) if objetivos is not None else None
+
+    pq: List[Tuple[float, int]] = [(0.0, s)]
+
+    while pq:
+        dist_actual, u = heapq.heappop(pq)
+        if u in asentados:
+            continue
+        asentados[u] = dist_actual
+
+        if pendientes is not None:
+            pendientes.discard(u)
+            if not pendientes:
+                break
+
+        for e in aristas_de(u):
+            w = pesos[e]
+            if w == INF:
+                continue
+
+            v = destinos[e]
+            nuevo = dist_actual + w
+
+            if nuevo < dist.get(v, INF):
+                dist[v] = nuevo
+                previo[v] = e
+                heapq.heappush(pq, (nuevo, v))
+
+    return asentados, previo
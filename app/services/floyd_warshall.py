@@ -1,81 +1,158 @@
-from typing import Dict, List, Tuple, Optional, Callable
+from typing import List, Tuple, Optional, Sequence
+
+import numpy as np
+
+from app.core.metrics import etapa
 from app.models.grafo import GrafoRutas
 from app.models.ruta import Ruta
 
+SIN_ARISTA = -1
+
 
 def floyd_warshall(
     grafo: GrafoRutas,
-    weight_func: Callable[[Ruta], float],
-) -> Tuple[
-    Dict[Tuple[str, str], float],
-    Dict[Tuple[str, str], Optional[str]],
-    Dict[Tuple[str, str], Optional[Ruta]],
-]:
-    nodos = grafo.obtener_nodos()
-    dist: Dict[Tuple[str, str], float] = {}
-    next_hop: Dict[Tuple[str, str], Optional[str]] = {}
-    edge_used: Dict[Tuple[str, str], Optional[Ruta]] = {}  # NUEVO
-
-    # Inicialización
-    for i in nodos:
-        for j in nodos:
-            if i == j:
-                dist[(i, j)] = 0.0
-                next_hop[(i, j)] = j
-            else:
-                dist[(i, j)] = float("inf")
-                next_hop[(i, j)] = None
-            edge_used[(i, j)] = None
-
-    # Distancias directas
-    for i in nodos:
-        for ruta in grafo.vecinos(i):
-            w = weight_func(ruta)
-            if w < dist[(ruta.origen, ruta.destino)]:
-                dist[(ruta.origen, ruta.destino)] = w
-                next_hop[(ruta.origen, ruta.destino)] = ruta.destino
-                edge_used[(ruta.origen, ruta.destino)] = ruta  # guardamos la ruta exacta
-
-    # Triple bucle FW
-    for k in nodos:
-        for i in nodos:
-            for j in nodos:
-                if dist[(i, k)] + dist[(k, j)] < dist[(i, j)]:
-                    dist[(i, j)] = dist[(i, k)] + dist[(k, j)]
-                    next_hop[(i, j)] = next_hop[(i, k)]
-                    # edge_used se sigue usando tal cual para la reconstrucción
+    pesos: Sequence[float],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Floyd-Warshall vectorizado sobre los índices internos del grafo.
+
+    Devuelve tres matrices n x n:
+      - dist[i, j]: costo mínimo de i a j (inf si no hay camino)
+      - next_hop[i, j]: índice del siguiente nodo en el camino i -> j (-1 si no hay)
+      - edge_used[i, j]: índice de la arista del primer tramo de i -> j (-1 si no hay)
+
+    Por cada k se hace una sola pasada con broadcasting fila/columna en vez
+    del triple bucle en Python.
+    """
+    n = grafo.num_nodos()
+    m = grafo.num_aristas()
+
+    dist = np.full((n, n), np.inf, dtype=np.float64)
+    next_hop = np.full((n, n), SIN_ARISTA, dtype=np.int32)
+    edge_used = np.full((n, n), SIN_ARISTA, dtype=np.int32)
+
+    diag = np.arange(n)
+    dist[diag, diag] = 0.0
+    next_hop[diag, diag] = diag
+
+    # Distancias directas (si hay varias aristas entre dos nodos, gana la más barata)
+    if m:
+        pesos = np.asarray(pesos, dtype=np.float64)
+        origenes = np.fromiter(grafo.origenes, dtype=np.intp, count=m)
+        destinos = np.fromiter(grafo.destinos, dtype=np.intp, count=m)
+
+        np.minimum.at(dist, (origenes, destinos), pesos)
+        usadas = np.isfinite(pesos) & (pesos == dist[origenes, destinos]) & (origenes != destinos)
+        aristas = np.nonzero(usadas)[0]
+        next_hop[origenes[aristas], destinos[aristas]] = destinos[aristas]
+        edge_used[origenes[aristas], destinos[aristas]] = aristas
+
+    # Relajación por cada nodo intermedio k
+    for k in range(n):
+        via = dist[:, k, None] + dist[None, k, :]
+        mejor = via < dist
+        if not mejor.any():
+            continue
+        np.copyto(dist, via, where=mejor)
+        np.copyto(next_hop, next_hop[:, k, None], where=mejor)
+        np.copyto(edge_used, edge_used[:, k, None], where=mejor)
 
     return dist, next_hop, edge_used
 
 
+@etapa("reconstruccion")
 def reconstruir_ruta_floyd(
     origen: str,
     destino: str,
     grafo: GrafoRutas,
-    next_hop: Dict[Tuple[str, str], Optional[str]],
-    edge_used: Dict[Tuple[str, str], Optional[Ruta]],
-    weight_func: Callable[[Ruta], float],
+    next_hop: np.ndarray,
+    edge_used: np.ndarray,
+    pesos: Sequence[float],
 ) -> Optional[List[Ruta]]:
-    if next_hop.get((origen, destino)) is None:
+    i = grafo.indice.get(origen)
+    j = grafo.indice.get(destino)
+    if i is None or j is None or next_hop[i, j] == SIN_ARISTA:
         return None
 
     ruta_completa: List[Ruta] = []
-    actual = origen
+    actual = i
 
-    while actual != destino:
-        siguiente = next_hop.get((actual, destino))
-        if siguiente is None:
+    while actual != j:
+        # edge_used guarda el primer tramo de cada par, así que cada salto
+        # tiene su arista concreta aunque no sean nodos adyacentes
+        e = int(edge_used[actual, j])
+        if e == SIN_ARISTA:
             return None
 
-        ruta = edge_used.get((actual, siguiente))
-        if ruta is None:
-            # no tenemos una arista concreta para este salto
+        if pesos[e] == float("inf"):
             return None
 
-        if weight_func(ruta) == float("inf"):
-            return None
+        ruta_completa.append(grafo.ruta(e))
+        actual = grafo.destinos[e]
 
-        ruta_completa.append(ruta)
-        actual = siguiente
+        if len(ruta_completa) > grafo.num_nodos():
+            # tablas inconsistentes (no debería pasar)
+            return None
 
     return ruta_completa
+
+
+# ------------------------------
+# Actualización incremental
+# ------------------------------
+
+def ampliar_tablas_fw(
+    dist: np.ndarray,
+    next_hop: np.ndarray,
+    edge_used: np.ndarray,
+    n: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Copia las tablas a tamaño n x n; los nodos nuevos empiezan aislados."""
+    m = dist.shape[0]
+    nuevo_dist = np.full((n, n), np.inf, dtype=np.float64)
+    nuevo_next = np.full((n, n), SIN_ARISTA, dtype=np.int32)
+    nuevo_edge = np.full((n, n), SIN_ARISTA, dtype=np.int32)
+    nuevo_dist[:m, :m] = dist
+    nuevo_next[:m, :m] = next_hop
+    nuevo_edge[:m, :m] = edge_used
+
+    nuevos = np.arange(m, n)
+    nuevo_dist[nuevos, nuevos] = 0.0
+    nuevo_next[nuevos, nuevos] = nuevos
+    return nuevo_dist, nuevo_next, nuevo_edge
+
+
+def agregar_arista_fw(
+    dist: np.ndarray,
+    next_hop: np.ndarray,
+    edge_used: np.ndarray,
+    u: int,
+    v: int,
+    w: float,
+    e: int,
+) -> int:
+    """
+    Actualiza en sitio las tablas cuando aparece la arista e = (u, v) de peso
+    w, o cuando su peso baja a w. Solo puede mejorar caminos que pasen por
+    ella, así que basta con una relajación O(n^2):
+        dist[i, j] = min(dist[i, j], dist[i, u] + w + dist[v, j])
+    Devuelve cuántos pares mejoraron.
+    """
+    if w == float("inf") or u == v:
+        return 0
+
+    col_dist = dist[:, u].copy()
+    col_next = next_hop[:, u].copy()
+    col_edge = edge_used[:, u].copy()
+    col_next[u] = v
+    col_edge[u] = e
+
+    via = col_dist[:, None] + w + dist[v, :][None, :]
+    mejor = via < dist
+    cambios = int(np.count_nonzero(mejor))
+    if cambios:
+        np.copyto(dist, via, where=mejor)
+        np.copyto(next_hop, col_next[:, None], where=mejor)
+        np.copyto(edge_used, col_edge[:, None], where=mejor)
+    return cambios
+
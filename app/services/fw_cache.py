@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from app.core.cache import DISCO_GRACIA_S
+
+# Tablas de Floyd-Warshall: (dist, next_hop, edge_used)
+TablasFloyd = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# clave = (criterio, máscara de transporte, clase de peso, versión del grafo)
+ClaveFloyd = Tuple[str, int, str, str]
+
+_ARCHIVOS = ("dist", "next_hop", "edge_used")
+
+FW_CACHE_DIR = Path(
+    os.getenv("ECOROUTE_FW_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ecoroute_fw_cache"))
+)
+FW_CACHE_MB = int(os.getenv("ECOROUTE_FW_CACHE_MB", "512"))
+
+
+class CacheFloyd:
+    """
+    Cache persistente de tablas all-pairs compartido entre peticiones y
+    entre workers.
+
+    Cada entrada es un directorio con tres .npy que se abren con mmap en
+    modo solo lectura, así todos los procesos de uvicorn comparten las
+    mismas páginas en memoria sin recalcular ni copiar las matrices.
+    Las entradas se publican con un rename atómico y el mtime del
+    directorio marca el último uso (de cualquier worker). Si se supera el
+    presupuesto de disco se eliminan las menos usadas recientemente, de
+    cualquier versión del grafo, salvo las usadas en los últimos
+    DISCO_GRACIA_S: pueden ser de otro worker que sigue en otra versión.
+    """
+
+    def __init__(self, directorio: Path, presupuesto_bytes: int):
+        self.directorio = Path(directorio)
+        self.presupuesto_bytes = presupuesto_bytes
+        self._abiertas: Dict[ClaveFloyd, TablasFloyd] = {}
+        self._locks: Dict[ClaveFloyd, threading.Lock] = {}
+        self._marcadas: Dict[ClaveFloyd, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nombre(clave: ClaveFloyd) -> str:
+        criterio, mascara, clase_peso, version = clave
+        return f"{version}__{criterio}__m{mascara}__{clase_peso}"
+
+    def obtener(self, clave: ClaveFloyd, calcular: Callable[[], TablasFloyd]) -> TablasFloyd:
+        tablas = self._abiertas.get(clave)
+        if tablas is not None:
+            self._marcar_uso(clave)
+            return tablas
+
+        with self._lock:
+            lock_clave = self._locks.setdefault(clave, threading.Lock())
+
+        with lock_clave:
+            tablas = self._abiertas.get(clave)
+            if tablas is not None:
+                return tablas
+
+            ruta = self.directorio / self._nombre(clave)
+            tablas = self._abrir(ruta)
+            if tablas is None:
+                self._guardar(ruta, calcular())
+                tablas = self._abrir(ruta)
+                self._desalojar(clave)
+
+            with self._lock:
+                self._abiertas[clave] = tablas
+                self._marcadas[clave] = time.time()
+            return tablas
+
+    def _marcar_uso(self, clave: ClaveFloyd) -> None:
+        # Las tablas abiertas se leen de memoria: el mtime en disco se renueva
+        # de vez en cuando para que otros workers no las den por abandonadas
+        ahora = time.time()
+        if ahora - self._marcadas.get(clave, 0.0) < DISCO_GRACIA_S / 4:
+            return
+        self._marcadas[clave] = ahora
+        try:
+            os.utime(self.directorio / self._nombre(clave))
+        except OSError:
+            pass
+
+    def _abrir(self, ruta: Path):
+        try:
+            tablas = tuple(np.load(ruta / f"{nombre}.npy", mmap_mode="r") for nombre in _ARCHIVOS)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            # Marca de uso para el desalojo LRU
+            os.utime(ruta)
+        except OSError:
+            pass
+        return tablas
+
+    def _guardar(self, ruta: Path, tablas: TablasFloyd) -> None:
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        tmp = self.directorio / f".tmp-{os.getpid()}-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        try:
+            for nombre, matriz in zip(_ARCHIVOS, tablas):
+                np.save(tmp / f"{nombre}.npy", np.ascontiguousarray(matriz))
+            try:
+                os.rename(tmp, ruta)
+            except OSError:
+                # Otro worker publicó la misma entrada antes que nosotros
+                pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _desalojar(self, actual: ClaveFloyd) -> None:
+        version = actual[3]
+        nombre_actual = self._nombre(actual)
+
+        # Este worker ya no usa otras versiones; en disco quedan para los demás
+        with self._lock:
+            for clave in [c for c in self._abiertas if c[3] != version]:
+                del self._abiertas[clave]
+                self._locks.pop(clave, None)
+                self._marcadas.pop(clave, None)
+
+        entradas = []
+        for ruta in self.directorio.iterdir():
+            if ruta.name.startswith(".") or not ruta.is_dir():
+                continue
+            try:
+                tam = sum(f.stat().st_size for f in ruta.iterdir())
+                entradas.append((ruta.stat().st_mtime, tam, ruta))
+            except OSError:
+                continue
+
+        total = sum(tam for _, tam, _ in entradas)
+        limite = time.time() - DISCO_GRACIA_S
+        for mtime, tam, ruta in sorted(entradas, key=lambda x: x[0]):
+            if total <= self.presupuesto_bytes or mtime >= limite:
+                # Lo que queda se usó hace poco (aquí o en otro worker)
+                break
+            if ruta.name == nombre_actual:
+                continue
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tam
+            with self._lock:
+                for clave in [c for c in self._abiertas if self._nombre(c) == ruta.name]:
+                    del self._abiertas[clave]
+                    self._marcadas.pop(clave, None)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._abiertas.clear()
+            self._locks.clear()
+            self._marcadas.clear()
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+
+cache_floyd = CacheFloyd(FW_CACHE_DIR, FW_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import CacheLRU
+from app.core.metrics import etapa
+from app.core.security import get_username_opcional
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models.grafo import GrafoRutas
+from app.models.grafo_overlay import GrafoOverlay
+from app.models.nodo import Nodo
+from app.models.ruta import Ruta
+from app.routing_config.service import cargar_config, revision_config
+
+
+@dataclass(frozen=True)
+class GrafoSnapshot:
+    """
+    Foto inmutable del grafo compartida por todas las peticiones del proceso.
+    Nadie debe modificar `grafo` después de publicarlo: para cambiarlo se
+    carga uno nuevo y se reemplaza la referencia completa.
+    """
+    grafo: GrafoRutas
+    version: str
+    cargado_en: float = field(default_factory=time.time)
+
+
+_snapshot: Optional[GrafoSnapshot] = None
+_lock = threading.Lock()
+_lock_async: Optional[asyncio.Lock] = None
+
+# Overlays por (usuario, versión del grafo base, revisión de su config).
+# Cada uno guarda solo lo que agregó el usuario y sus propias tablas derivadas.
+_overlays = CacheLRU(int(os.getenv("ECOROUTE_CACHE_OVERLAYS", "128")))
+
+
+def _cargar(db=None) -> GrafoSnapshot:
+    grafo = GrafoRutas()
+    with etapa("carga_bd"):
+        if db is not None:
+            grafo.cargar_desde_bd(db)
+        else:
+            with SessionLocal() as session:
+                grafo.cargar_desde_bd(session)
+    return GrafoSnapshot(grafo=grafo, version=grafo.version)
+
+
+async def _cargar_async() -> GrafoSnapshot:
+    # Misma carga, pero la espera a la BD no bloquea el event loop
+    grafo = GrafoRutas()
+    with etapa("carga_bd"):
+        async with AsyncSessionLocal() as session:
+            await session.run_sync(grafo.cargar_desde_bd)
+    return GrafoSnapshot(grafo=grafo, version=grafo.version)
+
+
+def recargar_grafo(db=None) -> GrafoSnapshot:
+    """
+    Vuelve a leer paises/rutas de la BD y publica el nuevo grafo.
+    Las peticiones en curso siguen usando el snapshot anterior; el cambio
+    de referencia es atómico.
+    """
+    global _snapshot
+    nuevo = _cargar(db)
+    with _lock:
+        _snapshot = nuevo
+    return nuevo
+
+
+async def recargar_grafo_async() -> GrafoSnapshot:
+    global _snapshot
+    nuevo = await _cargar_async()
+    with _lock:
+        _snapshot = nuevo
+    return nuevo
+
+
+def obtener_snapshot() -> GrafoSnapshot:
+    """
+    Devuelve el snapshot actual. Si el arranque no pudo cargarlo
+    (BD caída, etc.), lo carga aquí una sola vez.
+    """
+    global _snapshot
+    snap = _snapshot
+    if snap is not None:
+        return snap
+    with _lock:
+        if _snapshot is None:
+            _snapshot = _cargar()
+        return _snapshot
+
+
+async def obtener_snapshot_async() -> GrafoSnapshot:
+    """Como obtener_snapshot, para código async."""
+    global _lock_async
+    snap = _snapshot
+    if snap is not None:
+        return snap
+    if _lock_async is None:
+        _lock_async = asyncio.Lock()
+    async with _lock_async:
+        if _snapshot is None:
+            await recargar_grafo_async()
+        return _snapshot
+
+
+def get_grafo() -> GrafoRutas:
+    # Dependencia para FastAPI
+    return obtener_snapshot().grafo
+
+
+def grafo_para_usuario(username: Optional[str]) -> Union[GrafoRutas, GrafoOverlay]:
+    """
+    Grafo compartido más los nodos/rutas personalizados del usuario.
+    Sin usuario o sin personalizaciones se devuelve el grafo base tal cual.
+    """
+    base = obtener_snapshot().grafo
+    if not username:
+        return base
+    revision = revision_config(username)
+    if revision is None:
+        return base
+
+    @etapa("overlay")
+    def construir():
+        cfg = cargar_config(username)
+        if not cfg.nodos and not cfg.rutas:
+            return base
+        nodos = [Nodo(n.id, n.nombre, n.lat, n.lon) for n in cfg.nodos]
+        rutas = [Ruta(**r.dict()) for r in cfg.rutas]
+        return GrafoOverlay(base, nodos, rutas, revision=f"{username}|{revision}")
+
+    return _overlays.obtener((username, base.version, revision), construir)
+
+
+async def get_grafo_usuario(username: Optional[str] = Depends(get_username_opcional)):
+    # Dependencia para FastAPI: grafo con las personalizaciones de quien consulta
+    snap = await obtener_snapshot_async()
+    if not username:
+        return snap.grafo
+    # Leer el log de personalizaciones es E/S de archivos: fuera del event loop
+    return await run_in_threadpool(grafo_para_usuario, username)
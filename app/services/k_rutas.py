@@ -0,0 +1,203 @@
+import heapq
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.models.grafo import GrafoRutas
+from app.models.ruta import Ruta
+
+INF = float("inf")
+
+
+def _arbol_hacia(
+    grafo: GrafoRutas,
+    t: int,
+    pesos: Sequence[float],
+) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """
+    Dijkstra inverso desde `t`: distancia exacta de cada nodo hasta t y la
+    arista por la que sale hacia t en el camino mínimo.
+    """
+    origenes = grafo.origenes
+    dist: Dict[int, float] = {t: 0.0}
+    siguiente: Dict[int, int] = {}
+    asentados: Dict[int, float] = {}
+    pq: List[Tuple[float, int]] = [(0.0, t)]
+
+    while pq:
+        d, v = heapq.heappop(pq)
+        if v in asentados:
+            continue
+        asentados[v] = d
+        for e in grafo.aristas_entrantes(v):
+            w = pesos[e]
+            if w == INF:
+                continue
+            u = origenes[e]
+            nuevo = d + w
+            if nuevo < dist.get(u, INF):
+                dist[u] = nuevo
+                siguiente[u] = e
+                heapq.heappush(pq, (nuevo, u))
+
+    return asentados, siguiente
+
+
+def _camino_por_arbol(
+    grafo: GrafoRutas,
+    u: int,
+    t: int,
+    siguiente: Dict[int, int],
+    aristas_prohibidas: Set[int],
+    nodos_prohibidos: Set[int],
+) -> Optional[List[int]]:
+    """Sigue el árbol hacia t; None si choca con algo prohibido."""
+    camino: List[int] = []
+    while u != t:
+        e = siguiente[u]
+        if e in aristas_prohibidas:
+            return None
+        u = grafo.destinos[e]
+        if u in nodos_prohibidos:
+            return None
+        camino.append(e)
+    return camino
+
+
+def _desvio(
+    grafo: GrafoRutas,
+    s: int,
+    t: int,
+    pesos: Sequence[float],
+    h: Dict[int, float],
+    aristas_prohibidas: Set[int],
+    nodos_prohibidos: Set[int],
+) -> Optional[Tuple[List[int], float]]:
+    """
+    A* de s a t sin las aristas/nodos prohibidos. `h` es la distancia
+    exacta a t en el grafo completo: quitar aristas solo alarga caminos,
+    así que sigue siendo una cota admisible y consistente.
+    """
+    aristas_de = grafo.aristas_de
+    destinos = grafo.destinos
+
+    dist: Dict[int, float] = {s: 0.0}
+    previo: Dict[int, int] = {}
+    cerrado = set()
+    pq: List[Tuple[float, int]] = [(h[s], s)]
+
+    while pq:
+        _, u = heapq.heappop(pq)
+        if u in cerrado:
+            continue
+        cerrado.add(u)
+        if u == t:
+            break
+
+        g = dist[u]
+        for e in aristas_de(u):
+            w = pesos[e]
+            if w == INF or e in aristas_prohibidas:
+                continue
+            v = destinos[e]
+            if v in nodos_prohibidos or v not in h:
+                continue
+            nuevo = g + w
+            if nuevo < dist.get(v, INF):
+                dist[v] = nuevo
+                previo[v] = e
+                heapq.heappush(pq, (nuevo + h[v], v))
+
+    if t not in cerrado:
+        return None
+
+    camino: List[int] = []
+    actual = t
+    while actual != s:
+        e = previo[actual]
+        camino.append(e)
+        actual = grafo.origenes[e]
+    camino.reverse()
+    return camino, dist[t]
+
+
+def k_rutas_mas_cortas(
+    grafo: GrafoRutas,
+    origen: str,
+    destino: str,
+    pesos: Sequence[float],
+    k: int,
+) -> List[Tuple[List[Ruta], float]]:
+    """
+    Las k mejores rutas sin ciclos de origen a destino (algoritmo de Yen).
+
+    Reutilización respecto a Yen "de libro":
+      - Un solo Dijkstra inverso desde el destino. Sus distancias guían
+        cada búsqueda de desvío con A* (cota exacta en el grafo completo).
+        Si el camino del árbol desde el nodo de desvío no toca nada
+        prohibido, ese es el desvío óptimo y no se busca nada.
+      - Los costos de prefijo de cada ruta aceptada se calculan una vez.
+        Las aristas a prohibir para cada prefijo se indexan por prefijo,
+        sin recorrer todas las rutas aceptadas en cada desvío.
+    """
+    s = grafo.indice[origen]
+    t = grafo.indice[destino]
+
+    h, siguiente = _arbol_hacia(grafo, t, pesos)
+    if s not in h:
+        return []
+
+    primera = _camino_por_arbol(grafo, s, t, siguiente, set(), set())
+    aceptadas: List[Tuple[List[int], float]] = [(primera, h[s])]
+    vistas = {tuple(primera)}
+
+    # prefijo (tupla de aristas) -> aristas que lo continúan en rutas aceptadas
+    continuaciones: Dict[Tuple[int, ...], Set[int]] = {}
+
+    def registrar(camino: List[int]) -> None:
+        for i in range(len(camino)):
+            continuaciones.setdefault(tuple(camino[:i]), set()).add(camino[i])
+
+    registrar(primera)
+    candidatas: List[Tuple[float, int, List[int]]] = []
+    contador = 0
+
+    while len(aceptadas) < k:
+        ultima, _ = aceptadas[-1]
+
+        # Costos y nodos de prefijo de la última ruta aceptada
+        prefijo_costo = [0.0]
+        nodos = [s]
+        for e in ultima:
+            prefijo_costo.append(prefijo_costo[-1] + pesos[e])
+            nodos.append(grafo.destinos[e])
+
+        for i in range(len(ultima)):
+            raiz = tuple(ultima[:i])
+            nodo_desvio = nodos[i]
+            prohibidas = continuaciones.get(raiz, set())
+            nodos_raiz = set(nodos[:i])
+
+            desvio = _camino_por_arbol(grafo, nodo_desvio, t, siguiente, prohibidas, nodos_raiz)
+            if desvio is not None:
+                costo_desvio = h[nodo_desvio]
+            else:
+                encontrado = _desvio(grafo, nodo_desvio, t, pesos, h, prohibidas, nodos_raiz)
+                if encontrado is None:
+                    continue
+                desvio, costo_desvio = encontrado
+
+            camino = list(raiz) + desvio
+            clave = tuple(camino)
+            if clave in vistas:
+                continue
+            vistas.add(clave)
+            contador += 1
+            heapq.heappush(candidatas, (prefijo_costo[i] + costo_desvio, contador, camino))
+
+        if not candidatas:
+            break
+
+        costo, _, camino = heapq.heappop(candidatas)
+        aceptadas.append((camino, costo))
+        registrar(camino)
+
+    return [([grafo.ruta(e) for e in camino], costo) for camino, costo in aceptadas]
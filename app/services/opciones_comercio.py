@@ -0,0 +1,78 @@
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Set
+
+from sqlalchemy import select
+
+from app.models.trade_data import TradeData
+from app.services.vista_incremental import Marca, VistaIncremental
+
+
+@dataclass(frozen=True)
+class OpcionesMaterializadas:
+    """Respuesta de /api/trade-options ya serializada, con su ETag."""
+    cuerpo: bytes
+    etag: str
+    marca: Marca
+    generado_en: float
+
+
+class VistaOpciones(VistaIncremental):
+    """
+    Orígenes, destinos y productos distintos de trade_data, mantenidos en
+    memoria como una vista materializada. Las altas se agregan a los
+    conjuntos; ante borrados se vuelven a leer los DISTINCT.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._origenes: Set[str] = set()
+        self._destinos: Set[str] = set()
+        self._productos: Set[str] = set()
+
+    def _reconstruir(self, db, hasta_id: int) -> None:
+        def distintos(columna) -> Set[str]:
+            consulta = select(columna).where(columna.isnot(None), TradeData.id <= hasta_id).distinct()
+            return {v for v in db.execute(consulta).scalars() if v}
+
+        self._origenes = distintos(TradeData.origin)
+        self._destinos = distintos(TradeData.destination)
+        self._productos = distintos(TradeData.product)
+
+    def _agregar_nuevas(self, db, desde_id: int, hasta_id: int) -> int:
+        filas = db.execute(
+            select(TradeData.origin, TradeData.destination, TradeData.product)
+            .where(TradeData.id > desde_id, TradeData.id <= hasta_id)
+        ).all()
+        for origen, destino, producto in filas:
+            if origen:
+                self._origenes.add(origen)
+            if destino:
+                self._destinos.add(destino)
+            if producto:
+                self._productos.add(producto)
+        return len(filas)
+
+    def _publicar(self, marca: Marca) -> OpcionesMaterializadas:
+        datos = {
+            "origins": sorted(self._origenes),
+            "destinations": sorted(self._destinos),
+            "products": sorted(self._productos),
+        }
+        cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(cuerpo).hexdigest()[:20] + '"'
+        anterior = self.actual
+        if anterior is not None and anterior.etag == etag:
+            # Mismo contenido (filas nuevas con valores ya conocidos): se conserva el ETag
+            return OpcionesMaterializadas(anterior.cuerpo, etag, marca, anterior.generado_en)
+        return OpcionesMaterializadas(cuerpo, etag, marca, time.time())
+
+    def paises(self) -> Set[str]:
+        """Todos los nombres de país vistos como origen o destino."""
+        with self._lock:
+            return self._origenes | self._destinos
+
+
+vista_opciones = VistaOpciones()
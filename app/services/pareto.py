@@ -0,0 +1,83 @@
+import heapq
+from typing import Dict, List, Sequence, Tuple
+
+from app.models.grafo import GrafoRutas
+from app.models.ruta import Ruta
+
+INF = float("inf")
+
+
+def rutas_pareto(
+    grafo: GrafoRutas,
+    origen: str,
+    destino: str,
+    pesos_tiempo: Sequence[float],
+    pesos_costo: Sequence[float],
+    epsilon: float = 0.01,
+) -> List[Tuple[List[Ruta], float, float]]:
+    """
+    Rutas no dominadas en (tiempo, costo) con una sola búsqueda de etiquetas.
+
+    Las etiquetas salen de la cola en orden lexicográfico (tiempo, costo),
+    así que las etiquetas definitivas de cada nodo tienen tiempo creciente y
+    costo decreciente. Una etiqueta nueva solo puede estar dominada por la
+    última definitiva del nodo, y comprobarlo es O(1).
+
+    Con `epsilon` > 0 una etiqueta se descarta si no mejora el costo de la
+    última definitiva en más de ese factor (dominancia epsilon). Así el
+    número de etiquetas por nodo queda acotado por
+    log(costo_max / costo_min) / log(1 + epsilon).
+
+    Devuelve [(rutas, tiempo, costo)] ordenado por tiempo.
+    """
+    s = grafo.indice[origen]
+    t = grafo.indice[destino]
+    aristas_de = grafo.aristas_de
+    destinos = grafo.destinos
+    factor = 1.0 + epsilon
+
+    # Etiquetas: (nodo, etiqueta previa, arista usada); índice = id
+    etiquetas: List[Tuple[int, int, int]] = [(s, -1, -1)]
+    mejor_costo: Dict[int, float] = {}   # costo de la última etiqueta definitiva por nodo
+    definitivas_t: List[Tuple[int, float, float]] = []
+
+    pq: List[Tuple[float, float, int]] = [(0.0, 0.0, 0)]
+
+    while pq:
+        tiempo, costo, id_etq = heapq.heappop(pq)
+        u = etiquetas[id_etq][0]
+
+        if costo * factor >= mejor_costo.get(u, INF):
+            continue
+        # Todo lo que ya no mejora el costo de las rutas encontradas al destino sobra
+        if u != t and definitivas_t and costo * factor >= definitivas_t[-1][2]:
+            continue
+
+        mejor_costo[u] = costo
+        if u == t:
+            definitivas_t.append((id_etq, tiempo, costo))
+            continue
+
+        for e in aristas_de(u):
+            wt = pesos_tiempo[e]
+            wc = pesos_costo[e]
+            if wt == INF or wc == INF:
+                continue
+            v = destinos[e]
+            nuevo_costo = costo + wc
+            if nuevo_costo * factor >= mejor_costo.get(v, INF):
+                continue
+            etiquetas.append((v, id_etq, e))
+            heapq.heappush(pq, (tiempo + wt, nuevo_costo, len(etiquetas) - 1))
+
+    resultado: List[Tuple[List[Ruta], float, float]] = []
+    for id_etq, tiempo, costo in definitivas_t:
+        aristas: List[int] = []
+        while etiquetas[id_etq][1] != -1:
+            _, previa, e = etiquetas[id_etq]
+            aristas.append(e)
+            id_etq = previa
+        aristas.reverse()
+        resultado.append(([grafo.ruta(e) for e in aristas], tiempo, costo))
+
+    return resultado
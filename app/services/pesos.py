@@ -0,0 +1,81 @@
+from array import array
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.models.grafo import GrafoRutas
+from app.models.grafo_overlay import GrafoOverlay, VistaConcatenada
+from app.models.producto import Producto
+
+INF = float("inf")
+
+
+@dataclass(frozen=True)
+class PerfilPeso:
+    """
+    Todo lo que determina el peso de una arista para una consulta:
+    criterio, tipos de transporte permitidos (máscara) y peso del producto.
+    """
+    criterio: str        # "rapidez" | "economia"
+    mascara: int         # bits de grafo.tipos permitidos
+    clase_peso: str      # "tiempo", "base" o toneladas del producto ("0.025t")
+    factor: float        # multiplicador del costo base (toneladas)
+
+    @property
+    def clave(self) -> Tuple[str, int, str]:
+        return self.criterio, self.mascara, self.clase_peso
+
+
+def perfil_para(grafo: GrafoRutas, criterio: str, producto: Optional[Producto]) -> PerfilPeso:
+    if producto:
+        mascara = grafo.mascara(producto.tipo_transporte_permitido)
+        factor = producto.peso_kg / 1000.0
+    else:
+        mascara = grafo.mascara_todos()
+        factor = 1.0
+
+    if criterio == "rapidez":
+        # El tiempo no depende del peso del producto
+        return PerfilPeso(criterio, mascara, "tiempo", factor)
+    if criterio == "economia":
+        return PerfilPeso(criterio, mascara, f"{factor:g}t" if producto else "base", factor)
+
+    raise ValueError("Criterio desconocido.")
+
+
+def pesos_aristas(grafo: GrafoRutas, perfil: PerfilPeso) -> array:
+    """
+    Peso de cada arista del grafo (en orden CSR) para el perfil dado.
+    Las aristas de un tipo de transporte no permitido valen +inf.
+    Se calcula una vez por versión del grafo y se reutiliza.
+
+    En un overlay de usuario solo se calculan las aristas extra; las del
+    grafo base salen de su propio cache.
+    """
+    if isinstance(grafo, GrafoOverlay):
+        return grafo.derivado(
+            ("pesos",) + perfil.clave,
+            lambda: VistaConcatenada(
+                pesos_aristas(grafo.base, perfil),
+                _construir_pesos(grafo, perfil, desde=grafo.num_aristas_base()),
+            ),
+        )
+    return grafo.derivado(("pesos",) + perfil.clave, lambda: _construir_pesos(grafo, perfil))
+
+
+def _construir_pesos(grafo: GrafoRutas, perfil: PerfilPeso, desde: int = 0) -> array:
+    if perfil.criterio == "rapidez":
+        base = grafo.tiempo_horas
+        factor = 1.0
+    else:
+        base = grafo.costo_base_usd_ton
+        factor = perfil.factor
+
+    modos = grafo.modos
+    if desde:
+        base, modos = base[desde:], modos[desde:]
+
+    mascara = perfil.mascara
+    return array(
+        "d",
+        (b * factor if m & mascara else INF for b, m in zip(base, modos)),
+    )
@@ -1,9 +1,19 @@
-from typing import Optional, List, Callable
+import os
+from typing import Dict, Optional, List, Tuple
+from app.core.cache import CacheLRU
+from app.core.metrics import etapa
 from app.models.grafo import GrafoRutas
+from app.models.grafo_overlay import GrafoOverlay
 from app.models.ruta import Ruta
 from app.models.producto import Producto
-from .dijkstra import dijkstra
-from .floyd_warshall import floyd_warshall, reconstruir_ruta_floyd
+from .astar import astar, dijkstra_bidireccional
+from .contraccion import obtener_jerarquia
+from .dijkstra import arbol_caminos_minimos, dijkstra, reconstruir_camino
+from .floyd_warshall import agregar_arista_fw, ampliar_tablas_fw, floyd_warshall, reconstruir_ruta_floyd
+from .fw_cache import cache_floyd
+from .k_rutas import k_rutas_mas_cortas
+from .pareto import rutas_pareto
+from .pesos import perfil_para, pesos_aristas
 
 
 class RutaNoEncontrada(Exception):
@@ -18,42 +28,28 @@ class ProductoInvalido(Exception):
     pass
 
 
+EPSILON_PARETO = float(os.getenv("ECOROUTE_EPSILON_PARETO", "0.01"))
+
+# Árboles de caminos mínimos ya calculados: (origen, perfil, versión) -> (dist, previo)
+_cache_arboles = CacheLRU(int(os.getenv("ECOROUTE_CACHE_ARBOLES", "256")))
+
+
 class RutasService:
     def __init__(self, grafo: GrafoRutas):
         self.grafo = grafo
-        self._fw_cache = {}  # cache por clave de peso
 
     def _mapear_criterio(self, criterio: str) -> str:
         if criterio in ("rapidez", "economia"):
             return criterio
         raise ValueError("Criterio no válido (use 'rapidez' o 'economia').")
 
-    def _build_weight_func(
-        self,
-        criterio: str,
-        producto: Optional[Producto],
-    ) -> Callable[[Ruta], float]:
-        if criterio == "rapidez":
-            # Optimizar por tiempo, independiente del producto
-            def wf(r: Ruta) -> float:
-                # Si el producto no puede ir por este tipo de ruta, la descartamos
-                if producto and r.tipo not in producto.tipo_transporte_permitido:
-                    return float("inf")
-                return r.tiempo_horas
-            return wf
-
-        if criterio == "economia":
-            def wf(r: Ruta) -> float:
-                if producto and r.tipo not in producto.tipo_transporte_permitido:
-                    return float("inf")
-                # Si hay producto: costo proporcional al peso
-                if producto:
-                    return r.costo_base_usd_ton * (producto.peso_kg / 1000.0)
-                # Si no hay producto: usamos costo base como referencia
-                return r.costo_base_usd_ton
-            return wf
-
-        raise ValueError("Criterio desconocido.")
+    def _obtener_producto(self, producto_id: Optional[str]) -> Optional[Producto]:
+        if not producto_id:
+            return None
+        producto = self.grafo.obtener_producto(producto_id)
+        if not producto:
+            raise ProductoInvalido(f"El producto '{producto_id}' no existe.")
+        return producto
 
     def calcular_ruta_optima(
         self,
@@ -62,6 +58,7 @@ class RutasService:
         origen: str,
         destino: str,
         producto_id: Optional[str] = None,
+        k: Optional[int] = None,
     ):
         if not self.grafo.validar_pais(origen):
             raise PaisInvalido(f"El país de origen '{origen}' no existe.")
@@ -70,41 +67,267 @@ class RutasService:
         if origen == destino:
             raise RutaNoEncontrada("El origen y destino no pueden ser el mismo.")
 
+        if criterio == "pareto":
+            return self._calcular_pareto(origen, destino, self._obtener_producto(producto_id))
+
         criterio_norm = self._mapear_criterio(criterio)
+        producto = self._obtener_producto(producto_id)
+
+        # Pesos precalculados por arista (prohibidas = +inf), cacheados por versión del grafo
+        with etapa("pesos"):
+            perfil = perfil_para(self.grafo, criterio_norm, producto)
+            pesos = pesos_aristas(self.grafo, perfil)
+
+        if k and k > 1:
+            # Rutas alternativas ordenadas (la primera es la óptima)
+            with etapa("busqueda"):
+                alternativas = k_rutas_mas_cortas(self.grafo, origen, destino, pesos, k)
+            if not alternativas:
+                raise RutaNoEncontrada("No existe una ruta disponible para los parámetros seleccionados.")
+            resumenes = [self._agregar_resumen_ruta(r, criterio_norm, producto) for r, _ in alternativas]
+            return {**resumenes[0], "alternativas": resumenes}
+
+        rutas = self._buscar(algoritmo, origen, destino, perfil, pesos)
+
+        return self._agregar_resumen_ruta(rutas, criterio_norm, producto)
 
-        producto: Optional[Producto] = None
-        if producto_id:
-            producto = self.grafo.obtener_producto(producto_id)
-            if not producto:
-                raise ProductoInvalido(f"El producto '{producto_id}' no existe.")
+    def precalcular(self, criterio: str, producto_id: Optional[str] = None, floyd: bool = True):
+        """
+        Deja listos los pesos y, si `floyd`, las tablas de Floyd-Warshall
+        del perfil (criterio, producto). Devuelve el perfil.
+        """
+        producto = self._obtener_producto(producto_id)
+        perfil = perfil_para(self.grafo, self._mapear_criterio(criterio), producto)
+        pesos = pesos_aristas(self.grafo, perfil)
+        if floyd:
+            self._tablas_floyd(perfil, pesos)
+        return perfil
 
-        weight_func = self._build_weight_func(criterio_norm, producto)
+    @etapa("busqueda")
+    def _buscar(self, algoritmo: str, origen: str, destino: str, perfil, pesos) -> List[Ruta]:
+        """Camino óptimo con el algoritmo pedido, ya como lista de Ruta."""
+        arbol = _cache_arboles.get((origen, perfil.clave, self.grafo.version))
 
-        if algoritmo == "dijkstra":
-            resultado = dijkstra(self.grafo, origen, destino, weight_func)
+        if algoritmo == "dijkstra" and arbol is not None:
+            # Ya tenemos el árbol completo desde este origen: O(largo del camino)
+            dist, previo = arbol
+            t = self.grafo.indice[destino]
+            rutas = reconstruir_camino(self.grafo, previo, self.grafo.indice[origen], t) if t in dist else None
+            if not rutas:
+                raise RutaNoEncontrada("No existe una ruta disponible para los parámetros seleccionados.")
+
+        elif algoritmo in ("dijkstra", "astar", "bidireccional"):
+            if algoritmo == "astar":
+                resultado = astar(self.grafo, origen, destino, pesos, perfil)
+            elif algoritmo == "bidireccional":
+                resultado = dijkstra_bidireccional(self.grafo, origen, destino, pesos, perfil)
+            else:
+                resultado = dijkstra(self.grafo, origen, destino, pesos)
             if resultado is None:
                 raise RutaNoEncontrada("No existe una ruta disponible para los parámetros seleccionados.")
             rutas, _ = resultado
 
-        elif algoritmo == "floyd-warshall":
-            cache_key = (criterio_norm, producto_id or "no_product")
-
-            if cache_key not in self._fw_cache:
-                dist, next_hop, edge_used = floyd_warshall(self.grafo, weight_func)
-                self._fw_cache[cache_key] = (dist, next_hop, edge_used)
+        elif algoritmo == "ch":
+            s, t = self.grafo.indice[origen], self.grafo.indice[destino]
+            grafo_ch = self.grafo
+            if isinstance(grafo_ch, GrafoOverlay):
+                # Sin rutas propias del usuario sirve la jerarquía del grafo base
+                usa_base = not grafo_ch.rutas_extra and max(s, t) < grafo_ch.base.num_nodos()
+                grafo_ch = grafo_ch.base if usa_base else None
 
-            dist, next_hop, edge_used = self._fw_cache[cache_key]
+            if grafo_ch is None:
+                # La jerarquía del grafo base no conoce las rutas del usuario
+                resultado = dijkstra_bidireccional(self.grafo, origen, destino, pesos, perfil)
+                rutas = resultado[0] if resultado else None
+            else:
+                # Contraction hierarchy precalculada por criterio y máscara de transporte
+                encontrado = obtener_jerarquia(grafo_ch, perfil).consulta(s, t)
+                rutas = [self.grafo.ruta(e) for e in encontrado[0]] if encontrado else None
+            if rutas is None:
+                raise RutaNoEncontrada("No existe una ruta disponible para los parámetros seleccionados.")
 
-            rutas = reconstruir_ruta_floyd(origen, destino, self.grafo, next_hop, edge_used, weight_func)
+        elif algoritmo == "floyd-warshall":
+            _, next_hop, edge_used = self._tablas_floyd(perfil, pesos)
+            rutas = reconstruir_ruta_floyd(origen, destino, self.grafo, next_hop, edge_used, pesos)
 
             if rutas is None:
                 raise RutaNoEncontrada("No existe una ruta disponible para los parámetros seleccionados.")
 
         else:
-            raise ValueError("Algoritmo no válido (use 'dijkstra' o 'floyd-warshall').")
+            raise ValueError(
+                "Algoritmo no válido (use 'dijkstra', 'floyd-warshall', 'astar', 'bidireccional' o 'ch')."
+            )
 
-        return self._agregar_resumen_ruta(rutas, criterio_norm, producto)
+        return rutas
+
+    @etapa("tablas_fw")
+    def _tablas_floyd(self, perfil, pesos):
+        """
+        Tablas de Floyd-Warshall del grafo para el perfil.
+
+        Las del grafo base se comparten entre peticiones y workers (ver
+        fw_cache). Para un overlay se parte de esas tablas y se agregan solo
+        las rutas del usuario, cada una en O(n^2); el resultado queda en
+        el propio overlay.
+        """
+        if not isinstance(self.grafo, GrafoOverlay):
+            return cache_floyd.obtener(
+                perfil.clave + (self.grafo.version,),
+                lambda: floyd_warshall(self.grafo, pesos),
+            )
+
+        overlay = self.grafo
+        base = overlay.base
+
+        def construir():
+            tablas = cache_floyd.obtener(
+                perfil.clave + (base.version,),
+                lambda: floyd_warshall(base, pesos_aristas(base, perfil)),
+            )
+            dist, next_hop, edge_used = ampliar_tablas_fw(*tablas, overlay.num_nodos())
+            for e in range(overlay.num_aristas_base(), overlay.num_aristas()):
+                agregar_arista_fw(
+                    dist, next_hop, edge_used,
+                    overlay.origenes[e], overlay.destinos[e], pesos[e], e,
+                )
+            return dist, next_hop, edge_used
+
+        return overlay.derivado(("floyd",) + perfil.clave, construir)
 
+    def _calcular_pareto(self, origen: str, destino: str, producto: Optional[Producto]):
+        """
+        Todas las rutas no dominadas en (tiempo, costo) de una sola pasada.
+        La principal es la más rápida; `alternativas` trae el frente completo,
+        de la más rápida a la más barata.
+        """
+        with etapa("pesos"):
+            pesos_tiempo = pesos_aristas(self.grafo, perfil_para(self.grafo, "rapidez", producto))
+            pesos_costo = pesos_aristas(self.grafo, perfil_para(self.grafo, "economia", producto))
+
+        with etapa("busqueda"):
+            frente = rutas_pareto(
+                self.grafo, origen, destino, pesos_tiempo, pesos_costo, epsilon=EPSILON_PARETO
+            )
+        if not frente:
+            raise RutaNoEncontrada("No existe una ruta disponible para los parámetros seleccionados.")
+
+        resumenes = [self._agregar_resumen_ruta(r, "pareto", producto) for r, _, _ in frente]
+        return {**resumenes[0], "alternativas": resumenes}
+
+    def calcular_rutas_lote(self, items: List[dict]) -> List[dict]:
+        """
+        Calcula muchas rutas (origen, destino, criterio, producto_id) de una vez.
+
+        Los pedidos se agrupan por origen y perfil de pesos; cada grupo
+        resuelve todos sus destinos con un único árbol de caminos mínimos.
+        Los errores se devuelven por ítem en vez de cortar todo el lote.
+        """
+        resultados: List[Optional[dict]] = [None] * len(items)
+        grupos: Dict[Tuple, List[int]] = {}
+        contexto: Dict[Tuple, Tuple] = {}
+
+        for pos, item in enumerate(items):
+            origen, destino = item["origen"], item["destino"]
+            try:
+                if not self.grafo.validar_pais(origen):
+                    raise PaisInvalido(f"El país de origen '{origen}' no existe.")
+                if not self.grafo.validar_pais(destino):
+                    raise PaisInvalido(f"El país de destino '{destino}' no existe.")
+                if origen == destino:
+                    raise RutaNoEncontrada("El origen y destino no pueden ser el mismo.")
+                criterio_norm = self._mapear_criterio(item["criterio"])
+                producto = self._obtener_producto(item.get("producto_id"))
+            except (PaisInvalido, ProductoInvalido, RutaNoEncontrada, ValueError) as e:
+                resultados[pos] = {"error": str(e)}
+                continue
+
+            perfil = perfil_para(self.grafo, criterio_norm, producto)
+            clave = (origen, perfil.clave, producto.id if producto else None)
+            grupos.setdefault(clave, []).append(pos)
+            contexto[clave] = (perfil, criterio_norm, producto)
+
+        for clave, posiciones in grupos.items():
+            origen = clave[0]
+            perfil, criterio_norm, producto = contexto[clave]
+            pesos = pesos_aristas(self.grafo, perfil)
+
+            s = self.grafo.indice[origen]
+            arbol = _cache_arboles.get((origen, perfil.clave, self.grafo.version))
+            if arbol is not None:
+                dist, previo = arbol
+            else:
+                objetivos = {self.grafo.indice[items[pos]["destino"]] for pos in posiciones}
+                dist, previo = arbol_caminos_minimos(self.grafo, s, pesos, objetivos)
+
+            for pos in posiciones:
+                t = self.grafo.indice[items[pos]["destino"]]
+                rutas = reconstruir_camino(self.grafo, previo, s, t) if t in dist else None
+                if not rutas:
+                    resultados[pos] = {
+                        "error": "No existe una ruta disponible para los parámetros seleccionados."
+                    }
+                    continue
+                resultados[pos] = self._agregar_resumen_ruta(rutas, criterio_norm, producto)
+
+        return resultados
+
+    def calcular_arbol(
+        self,
+        origen: str,
+        criterio: str,
+        producto_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Costo/tiempo/distancia desde `origen` a todos los países alcanzables,
+        junto con el predecesor de cada uno (árbol de caminos mínimos).
+        El árbol queda en cache y también lo aprovecha /ruta-optima.
+        """
+        if not self.grafo.validar_pais(origen):
+            raise PaisInvalido(f"El país de origen '{origen}' no existe.")
+
+        criterio_norm = self._mapear_criterio(criterio)
+        producto = self._obtener_producto(producto_id)
+        perfil = perfil_para(self.grafo, criterio_norm, producto)
+        pesos = pesos_aristas(self.grafo, perfil)
+
+        s = self.grafo.indice[origen]
+        dist, previo = _cache_arboles.obtener(
+            (origen, perfil.clave, self.grafo.version),
+            lambda: arbol_caminos_minimos(self.grafo, s, pesos),
+        )
+
+        # Acumulados a lo largo del árbol (los padres vienen antes que los hijos)
+        factor = producto.peso_kg / 1000.0 if producto else 1.0
+        g = self.grafo
+        acumulado: Dict[int, Tuple[float, float, float]] = {s: (0.0, 0.0, 0.0)}
+        destinos = {}
+        for v in dist:
+            if v == s:
+                continue
+            e = previo[v]
+            d, t, c = acumulado[g.origenes[e]]
+            acumulado[v] = (
+                d + g.distancia_km[e],
+                t + g.tiempo_horas[e],
+                c + g.costo_base_usd_ton[e] * factor,
+            )
+            destinos[g.ids[v]] = {
+                "previo": g.ids[g.origenes[e]],
+                "tipo": g.tipo_de(e),
+                "distancia_total": round(acumulado[v][0], 2),
+                "tiempo_total": round(acumulado[v][1], 2),
+                "costo_total": round(acumulado[v][2], 2),
+            }
+
+        return {
+            "origen": origen,
+            "criterio": criterio_norm,
+            "producto_id": producto.id if producto else None,
+            "version": g.version,
+            "destinos": destinos,
+        }
+
+    @etapa("resumen")
     def _agregar_resumen_ruta(
         self,
         rutas: List[Ruta],
@@ -114,13 +337,10 @@ class RutasService:
         distancia_total = sum(r.distancia_km for r in rutas)
         tiempo_total = sum(r.tiempo_horas for r in rutas)
 
-        if criterio == "economia":
-            weight_func = self._build_weight_func("economia", producto)
-            costo_total = sum(weight_func(r) for r in rutas)
-        else:
-            # Si no optimizamos por economía, igual calculamos un costo aproximado:
-            weight_func = self._build_weight_func("economia", producto)
-            costo_total = sum(weight_func(r) for r in rutas)
+        # Aunque no optimicemos por economía, igual calculamos el costo:
+        # costo base por tonelada, proporcional al peso si hay producto
+        factor = producto.peso_kg / 1000.0 if producto else 1.0
+        costo_total = sum(r.costo_base_usd_ton * factor for r in rutas)
 
         ruta_ids = [rutas[0].origen] + [r.destino for r in rutas]
         tipo_ruta = self._determinar_tipo_ruta(rutas)
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models.trade_data import TradeData
+
+# Cada cuánto se mira la marca de agua de trade_data en segundo plano (todas las vistas)
+INTERVALO_S = float(os.getenv("ECOROUTE_OPCIONES_INTERVALO", "30"))
+# Reconstrucción completa periódica: la marca no ve UPDATEs de filas existentes
+RECONSTRUIR_CADA_S = float(os.getenv("ECOROUTE_OPCIONES_RECONSTRUIR", "3600"))
+
+# (número de filas, id máximo)
+Marca = Tuple[int, int]
+
+
+def marca_trade_data(db) -> Marca:
+    filas, max_id = db.execute(select(func.count(TradeData.id), func.max(TradeData.id))).one()
+    return int(filas or 0), int(max_id or 0)
+
+
+class VistaIncremental(ABC):
+    """
+    Datos derivados de trade_data mantenidos en memoria.
+
+    Cada refresco consulta solo COUNT(id) y MAX(id). Si no cambiaron, no
+    hace nada; si solo se agregaron filas (ids nuevos por encima del
+    máximo anterior), procesa únicamente esas filas; en cualquier otro caso
+    (borrados) o cada RECONSTRUIR_CADA_S, reconstruye todo.
+    Las peticiones solo leen `actual`, que se reemplaza de una vez.
+
+    Las subclases implementan _reconstruir, _agregar_nuevas y _publicar.
+    """
+
+    def __init__(self):
+        self.actual: Any = None
+        self.marca: Optional[Marca] = None
+        self._reconstruida_en = 0.0
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _reconstruir(self, db, hasta_id: int) -> None:
+        """Rehace el estado interno con las filas con id <= hasta_id."""
+
+    @abstractmethod
+    def _agregar_nuevas(self, db, desde_id: int, hasta_id: int) -> int:
+        """Incorpora las filas con desde_id < id <= hasta_id y devuelve cuántas eran."""
+
+    @abstractmethod
+    def _publicar(self, marca: Marca) -> Any:
+        """Arma el valor que leen las peticiones a partir del estado interno."""
+
+    def refrescar(self, db=None) -> Any:
+        """Pone la vista al día con trade_data (ver docstring de la clase)."""
+        if db is None:
+            with SessionLocal() as session:
+                return self.refrescar(session)
+
+        with self._lock:
+            marca = marca_trade_data(db)
+            anterior = self.marca
+            vencida = time.monotonic() - self._reconstruida_en > RECONSTRUIR_CADA_S
+
+            if self.actual is not None and marca == anterior and not vencida:
+                return self.actual
+
+            # Las lecturas se acotan a id <= marca[1]: las filas insertadas
+            # después de tomar la marca quedan para el próximo refresco
+            if self.actual is None or vencida or marca[1] < anterior[1]:
+                self._reconstruir(db, marca[1])
+                self._reconstruida_en = time.monotonic()
+            else:
+                nuevas = self._agregar_nuevas(db, anterior[1], marca[1])
+                if anterior[0] + nuevas != marca[0]:
+                    # Además de altas hubo borrados: no se puede saber qué se quitó
+                    self._reconstruir(db, marca[1])
+                    self._reconstruida_en = time.monotonic()
+
+            self.actual = self._publicar(marca)
+            self.marca = marca
+            return self.actual
+
+    def obtener(self, db=None) -> Any:
+        """La vista actual; solo la primera vez (antes del calentamiento) va a la BD."""
+        actual = self.actual
+        if actual is not None:
+            return actual
+        return self.refrescar(db)
+
+
+async def refrescar_periodicamente(vista: VistaIncremental, intervalo: float = INTERVALO_S) -> None:
+    """Tarea del lifespan: mira la marca de agua cada `intervalo` segundos."""
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await run_in_threadpool(vista.refrescar)
+        except Exception as e:
+            # Si la BD no responde se sigue sirviendo la última vista
+            print(f"⚠️ No se pudo refrescar {type(vista).__name__}: {e}")
@@ -0,0 +1,136 @@
+"""
+Redes sintéticas para los benchmarks de ruteo.
+
+Genera países con coordenadas reales (sobre la esfera) y rutas entre
+vecinos cercanos más algunos enlaces largos, con una mezcla configurable
+de tipos de transporte. Distancia, tiempo y costo salen de la distancia de
+círculo máximo, así que A*/CH/etc. se prueban con datos geométricamente
+coherentes.
+"""
+import math
+import random
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+RADIO_TIERRA_KM = 6371.0
+
+# Velocidad (km/h) y costo (USD/ton/km) típicos por tipo de transporte
+PARAMETROS_MODO = {
+    "aerea": (800.0, 2.0),
+    "maritima": (35.0, 0.05),
+    "terrestre": (70.0, 0.2),
+    "mixta": (120.0, 0.4),
+}
+
+MEZCLA_DEFECTO = {"aerea": 0.3, "maritima": 0.4, "terrestre": 0.3}
+
+
+def parsear_mezcla(texto: str) -> Dict[str, float]:
+    """'aerea=0.3,maritima=0.5,terrestre=0.2' -> dict normalizado a suma 1."""
+    mezcla = {}
+    for parte in texto.split(","):
+        tipo, _, peso = parte.partition("=")
+        tipo = tipo.strip()
+        if tipo not in PARAMETROS_MODO:
+            raise ValueError(f"Tipo de transporte desconocido: '{tipo}'")
+        mezcla[tipo] = float(peso or 1)
+    total = sum(mezcla.values())
+    if total <= 0:
+        raise ValueError("La mezcla de transportes debe tener algún peso positivo.")
+    return {tipo: peso / total for tipo, peso in mezcla.items()}
+
+
+def _haversine(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def generar_red(
+    nodos: int,
+    grado: float = 6.0,
+    mezcla: Dict[str, float] = MEZCLA_DEFECTO,
+    enlaces_largos: float = 0.1,
+    semilla: int = 1,
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Devuelve (paises, rutas) como listas de dicts con las columnas de las
+    tablas `paises` y `rutas`.
+
+    `grado` es el número medio de rutas salientes por país; una fracción
+    `enlaces_largos` de ellas va a un destino al azar y el resto a los
+    vecinos más cercanos.
+    """
+    rnd = random.Random(semilla)
+
+    paises = []
+    coords: List[Tuple[float, float]] = []
+    for i in range(nodos):
+        # Uniforme sobre la esfera, sin los polos
+        lat = math.degrees(math.asin(rnd.uniform(-0.95, 0.95)))
+        lon = rnd.uniform(-180.0, 180.0)
+        coords.append((lat, lon))
+        paises.append({"id": f"N{i:04d}", "nombre": f"Nodo {i}", "lat": lat, "lon": lon})
+
+    tipos = list(mezcla)
+    pesos_tipo = [mezcla[t] for t in tipos]
+    cercanos = max(1, int(round(grado * (1 - enlaces_largos))))
+    largos = max(0, int(round(grado)) - cercanos)
+
+    rutas = []
+    for i in range(nodos):
+        # Vecinos cercanos por una muestra (O(n * muestra) en vez de O(n^2))
+        muestra = rnd.sample(range(nodos), min(nodos, max(8 * cercanos, 64)))
+        muestra = [j for j in muestra if j != i]
+        muestra.sort(key=lambda j: _haversine(coords[i], coords[j]))
+        destinos = muestra[:cercanos]
+        destinos += [rnd.randrange(nodos) for _ in range(largos)]
+
+        for j in destinos:
+            if j == i:
+                continue
+            tipo = rnd.choices(tipos, weights=pesos_tipo)[0]
+            velocidad, costo_km = PARAMETROS_MODO[tipo]
+            distancia = _haversine(coords[i], coords[j]) * rnd.uniform(1.0, 1.4)
+            rutas.append({
+                "id": len(rutas) + 1,
+                "origen_id": paises[i]["id"],
+                "destino_id": paises[j]["id"],
+                "tipo": tipo,
+                "distancia_km": distancia,
+                "tiempo_horas": distancia / velocidad * rnd.uniform(1.0, 1.3),
+                "costo_base_usd_ton": distancia * costo_km * rnd.uniform(1.0, 1.5),
+            })
+
+    return paises, rutas
+
+
+def sembrar_sqlite(ruta_db: Path, paises: List[dict], rutas: List[dict]) -> None:
+    """
+    Crea un archivo SQLite con las tablas `paises` y `rutas`. Se adjunta
+    como esquema `defaultdb`, igual que en MySQL (ver PaisModel/RutaModel).
+    """
+    ruta_db = Path(ruta_db)
+    if ruta_db.exists():
+        ruta_db.unlink()
+    con = sqlite3.connect(ruta_db)
+    try:
+        con.execute("CREATE TABLE paises (id TEXT PRIMARY KEY, nombre TEXT, lat REAL, lon REAL)")
+        con.execute(
+            "CREATE TABLE rutas (id INTEGER PRIMARY KEY, origen_id TEXT, destino_id TEXT, tipo TEXT,"
+            " distancia_km REAL, tiempo_horas REAL, costo_base_usd_ton REAL)"
+        )
+        con.executemany("INSERT INTO paises VALUES (:id, :nombre, :lat, :lon)", paises)
+        con.executemany(
+            "INSERT INTO rutas VALUES (:id, :origen_id, :destino_id, :tipo,"
+            " :distancia_km, :tiempo_horas, :costo_base_usd_ton)",
+            rutas,
+        )
+        con.commit()
+    finally:
+        con.close()
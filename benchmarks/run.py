@@ -0,0 +1,249 @@
+"""
+Benchmarks del ruteo sobre una red sintética cargada desde SQLite.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.run --nodos 500 --grado 6 --guardar benchmarks/baselines/n500.json
+    python -m benchmarks.run --nodos 500 --grado 6 --baseline benchmarks/baselines/n500.json
+
+Mide la carga del grafo (cargar_desde_bd), dijkstra, floyd_warshall,
+reconstruir_ruta_floyd y RutasService.calcular_ruta_optima de punta a punta
+para cada algoritmo. Con --baseline compara la mediana de cada caso contra
+la guardada y termina con código 1 si alguno empeora más que su umbral.
+No toca la BD real: DATABASE_URL apunta a un SQLite temporal.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.generador import MEZCLA_DEFECTO, generar_red, parsear_mezcla, sembrar_sqlite
+
+UMBRAL_DEFECTO = 0.25   # 25 % más lento que la línea base = regresión
+
+
+def _medir(funcion: Callable[[], object], repeticiones: int) -> List[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def _resumen(tiempos: List[float]) -> Dict[str, float]:
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))]
+    return {
+        "n": len(tiempos),
+        "mediana_ms": round(statistics.median(ordenados) * 1000, 4),
+        "p95_ms": round(p95 * 1000, 4),
+        "min_ms": round(ordenados[0] * 1000, 4),
+    }
+
+
+def _preparar_entorno(directorio: Path, paises: List[dict], rutas: List[dict]) -> None:
+    """SQLite con paises/rutas y caches en disco dentro de `directorio`."""
+    sembrar_sqlite(directorio / "defaultdb.db", paises, rutas)
+    os.environ["DATABASE_URL"] = f"sqlite:///{directorio / 'main.db'}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["ECOROUTE_FW_CACHE_DIR"] = str(directorio / "fw_cache")
+    os.environ["ECOROUTE_CH_DIR"] = str(directorio / "ch")
+
+    from sqlalchemy import event
+    import app.database as database
+    import app.models.users  # noqa: F401  (AnalisisResultado.user necesita User registrado)
+
+    ruta_defaultdb = directorio / "defaultdb.db"
+    for engine in (database.engine, database.async_engine.sync_engine):
+        @event.listens_for(engine, "connect")
+        def _adjuntar(dbapi_con, registro):
+            # Los modelos usan el esquema "defaultdb" como en MySQL
+            dbapi_con.execute(f"ATTACH DATABASE '{ruta_defaultdb}' AS defaultdb")
+
+
+def ejecutar(args) -> Dict[str, object]:
+    mezcla = parsear_mezcla(args.mezcla) if args.mezcla else MEZCLA_DEFECTO
+    paises, rutas = generar_red(args.nodos, args.grado, mezcla, semilla=args.semilla)
+
+    with tempfile.TemporaryDirectory(prefix="ecoroute_bench_") as tmp:
+        _preparar_entorno(Path(tmp), paises, rutas)
+
+        from app.database import SessionLocal
+        from app.models.grafo import GrafoRutas
+        from app.services.dijkstra import dijkstra
+        from app.services.floyd_warshall import floyd_warshall, reconstruir_ruta_floyd
+        from app.services.pesos import perfil_para, pesos_aristas
+        from app.services.rutas_service import RutaNoEncontrada, RutasService
+
+        resultados: Dict[str, Dict[str, float]] = {}
+
+        def cargar() -> GrafoRutas:
+            grafo = GrafoRutas()
+            with SessionLocal() as session:
+                grafo.cargar_desde_bd(session)
+            return grafo
+
+        resultados["carga_bd"] = _resumen(_medir(cargar, args.repeticiones))
+        grafo = cargar()
+
+        rnd = random.Random(args.semilla)
+        ids = grafo.obtener_nodos()
+        pares = [tuple(rnd.sample(ids, 2)) for _ in range(args.consultas)]
+
+        perfil = perfil_para(grafo, args.criterio, None)
+        pesos = pesos_aristas(grafo, perfil)
+
+        resultados["dijkstra"] = _resumen([
+            t for o, d in pares for t in _medir(lambda: dijkstra(grafo, o, d, pesos), 1)
+        ])
+
+        if grafo.num_nodos() <= args.max_nodos_fw:
+            tiempos_fw = _medir(lambda: floyd_warshall(grafo, pesos), max(1, args.repeticiones // 2))
+            resultados["floyd_warshall"] = _resumen(tiempos_fw)
+
+            _, next_hop, edge_used = floyd_warshall(grafo, pesos)
+            resultados["reconstruir_ruta_floyd"] = _resumen([
+                t for o, d in pares
+                for t in _medir(lambda: reconstruir_ruta_floyd(o, d, grafo, next_hop, edge_used, pesos), 1)
+            ])
+
+        servicio = RutasService(grafo)
+        for algoritmo in args.algoritmos.split(","):
+            algoritmo = algoritmo.strip()
+            if algoritmo == "floyd-warshall" and grafo.num_nodos() > args.max_nodos_fw:
+                continue
+
+            def consulta(o: str, d: str):
+                try:
+                    return servicio.calcular_ruta_optima(algoritmo, args.criterio, o, d)
+                except RutaNoEncontrada:
+                    # Pares sin camino también cuentan: es trabajo real del servicio
+                    return None
+
+            # La primera consulta arma las tablas (FW, CH): se mide aparte
+            inicio = time.perf_counter()
+            consulta(*pares[0])
+            resultados[f"servicio.{algoritmo}.preparacion"] = _resumen([time.perf_counter() - inicio])
+
+            resultados[f"servicio.{algoritmo}"] = _resumen([
+                t for o, d in pares for t in _medir(lambda: consulta(o, d), 1)
+            ])
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "config": {
+            "nodos": args.nodos,
+            "grado": args.grado,
+            "mezcla": mezcla,
+            "semilla": args.semilla,
+            "criterio": args.criterio,
+            "consultas": args.consultas,
+            "aristas": len(rutas),
+        },
+        "resultados": resultados,
+    }
+
+
+def _umbrales(texto: str) -> Dict[str, float]:
+    """'dijkstra=0.1,floyd_warshall=0.5' o ruta a un JSON con el mismo dict."""
+    if not texto:
+        return {}
+    if os.path.exists(texto):
+        with open(texto, "r", encoding="utf-8") as f:
+            return {k: float(v) for k, v in json.load(f).items()}
+    umbrales = {}
+    for parte in texto.split(","):
+        caso, _, valor = parte.partition("=")
+        umbrales[caso.strip()] = float(valor)
+    return umbrales
+
+
+def comparar(
+    actual: dict,
+    base: dict,
+    umbral: float,
+    umbrales: Dict[str, float],
+    minimo_ms: float = 0.0,
+) -> List[str]:
+    """
+    Devuelve una línea por caso; las que empiezan con 'REGRESION' fallan.
+    Diferencias absolutas por debajo de `minimo_ms` se consideran ruido.
+    """
+    if actual["config"] != base.get("config"):
+        print("⚠️ La configuración no coincide con la línea base; la comparación es orientativa.")
+
+    umbrales = {**base.get("umbrales", {}), **umbrales}
+    lineas = []
+    for caso, medida in actual["resultados"].items():
+        anterior = base.get("resultados", {}).get(caso)
+        if not anterior or caso.endswith(".preparacion"):
+            continue
+        limite = umbrales.get(caso, umbral)
+        ratio = medida["mediana_ms"] / anterior["mediana_ms"] if anterior["mediana_ms"] else 1.0
+        empeora = medida["mediana_ms"] - anterior["mediana_ms"] > minimo_ms
+        estado = "REGRESION" if ratio > 1 + limite and empeora else "ok"
+        lineas.append(
+            f"{estado:<9} {caso:<36} {anterior['mediana_ms']:>10.3f} -> {medida['mediana_ms']:>10.3f} ms"
+            f"  (x{ratio:.2f}, límite x{1 + limite:.2f})"
+        )
+    return lineas
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de ruteo de EcoRoute")
+    parser.add_argument("--nodos", type=int, default=300)
+    parser.add_argument("--grado", type=float, default=6.0, help="rutas salientes medias por país")
+    parser.add_argument("--mezcla", default="", help="ej. aerea=0.3,maritima=0.4,terrestre=0.3")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--criterio", default="rapidez", choices=["rapidez", "economia"])
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--algoritmos", default="dijkstra,astar,bidireccional,ch,floyd-warshall")
+    parser.add_argument("--max-nodos-fw", type=int, default=2000, help="omite Floyd-Warshall por encima")
+    parser.add_argument("--guardar", help="escribe los resultados como línea base JSON")
+    parser.add_argument("--baseline", help="línea base JSON contra la cual comparar")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_DEFECTO,
+                        help="empeoramiento relativo permitido de la mediana")
+    parser.add_argument("--umbrales", default="", help="por caso: caso=valor,... o un JSON")
+    parser.add_argument("--minimo-ms", type=float, default=0.05,
+                        help="diferencia absoluta de la mediana que se ignora como ruido")
+    args = parser.parse_args(argv)
+
+    actual = ejecutar(args)
+
+    for caso, medida in actual["resultados"].items():
+        print(f"{caso:<36} mediana {medida['mediana_ms']:>10.3f} ms   p95 {medida['p95_ms']:>10.3f} ms   n={medida['n']}")
+
+    if args.guardar:
+        destino = Path(args.guardar)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        if args.umbrales:
+            actual["umbrales"] = _umbrales(args.umbrales)
+        with destino.open("w", encoding="utf-8") as f:
+            json.dump(actual, f, ensure_ascii=False, indent=2)
+        print(f"Línea base guardada en {destino}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        lineas = comparar(actual, base, args.umbral, _umbrales(args.umbrales), args.minimo_ms)
+        print("\n".join(lineas))
+        if any(linea.startswith("REGRESION") for linea in lineas):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())